@@ -0,0 +1,73 @@
+"""Throughput and CPU cost of do_get with each IPC compression codec.
+
+Server and client share this process, so CPU time covers both compressing
+and decompressing. Wire size is the IPC stream size written with the same
+options.
+
+    python src/benchmarks/bench_compression.py --rows 5000000
+"""
+
+import argparse
+import time
+
+import pyarrow as pa
+
+from common import LocalServer
+from ruddy.client.client import Client
+from ruddy.utils import ipc
+
+# a mix of the column types typical for our duckdb tables
+QUERY = """
+    select
+        range as id,
+        range % 1000 as customer_id,
+        (random() * 1000)::decimal(10, 2) as amount,
+        random() as score,
+        timestamp '2024-01-01' + to_seconds(range) as created_at,
+        ['new', 'paid', 'shipped', 'returned'][range % 4 + 1] as status,
+        'customer-' || (range % 1000) as customer_name
+    from range({rows})"""
+
+
+def ipc_size(table: pa.Table, compression: str) -> int:
+    sink = pa.BufferOutputStream()
+    options = ipc.write_options(compression)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table, max_chunksize=100_000)
+    return sink.getvalue().size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with LocalServer() as server:
+        with Client(server.url) as client:
+            client.read_query(f"create table bench as {QUERY.format(rows=args.rows)}")
+            table = client.read_table("bench")
+
+        print(
+            f"{'codec':>6} {'wire MB':>8} {'ratio':>6} {'wall s':>7} "
+            f"{'cpu s':>6} {'MB/s':>8}"
+        )
+        raw = ipc_size(table, "none")
+        for codec in ("none", "lz4", "zstd"):
+            size = ipc_size(table, codec)
+            with Client(server.url, compression=codec) as client:
+                wall, cpu = [], []
+                for _ in range(args.repeat):
+                    start, start_cpu = time.perf_counter(), time.process_time()
+                    client.read_table("bench")
+                    wall.append(time.perf_counter() - start)
+                    cpu.append(time.process_time() - start_cpu)
+            best = min(wall)
+            print(
+                f"{codec:>6} {size / 1e6:>8.1f} {raw / size:>6.2f} {best:>7.3f} "
+                f"{min(cpu):>6.3f} {raw / 1e6 / best:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
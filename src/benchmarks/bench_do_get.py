@@ -0,0 +1,78 @@
+"""Compare streaming and materialized do_get.
+
+Each mode runs in a fresh process so that peak RSS is not shared between runs.
+
+    python src/benchmarks/bench_do_get.py --rows 20000000
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+from common import LocalServer
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(streaming: bool, rows: int, batch_size: int, queue: mp.Queue):
+    import pyarrow.flight as flight
+
+    with LocalServer() as server:
+        server.backend.config.update(streaming=streaming, batch_size=batch_size)
+        client = flight.FlightClient(server.url.location)
+        result = measure(client, rows)
+    result["mode"] = "streaming" if streaming else "materialized"
+    queue.put(result)
+
+
+def measure(client, rows: int) -> dict:
+    from ruddy.models.ticket_wrapper import TicketWrapper
+
+    query = f"""
+        select range as id, range * 2 as value, 'row-' || range as label
+        from range({rows})"""
+    ticket = TicketWrapper.ticket_from_command(query)
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    reader = client.do_get(ticket)
+    reader.read_chunk()
+    first_batch = time.perf_counter() - start
+    for _ in reader:
+        pass
+    total = time.perf_counter() - start
+
+    return {
+        "first_batch_s": first_batch,
+        "total_s": total,
+        "peak_rss_delta_mb": peak_rss_mb() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    for streaming in (False, True):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run, args=(streaming, args.rows, args.batch_size, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode:
+            raise SystemExit(f"benchmark process failed with {proc.exitcode}")
+        result = queue.get()
+        print(
+            "{mode:>12}: first batch {first_batch_s:.3f}s, "
+            "total {total_s:.3f}s, peak rss +{peak_rss_delta_mb:.0f}MB".format(**result)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Latency percentiles and throughput of the main client calls.
+
+A server is started on localhost with a generated table per row count.
+list_flights, get_flight_info, read_table, read_query and do_put are timed
+at every concurrency level, do_put also at every batch size. Results are
+printed and, with --output, written as json for comparison between runs.
+
+    python src/benchmarks/bench_suite.py --rows 100000 1000000 \\
+        --concurrency 1 4 16 --output results.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import duckdb
+import pyarrow as pa
+
+from common import LocalServer, summarize
+from ruddy.client.client import Client
+
+OPERATIONS = ("list_flights", "get_flight_info", "read_table", "read_query", "do_put")
+
+
+def table_query(rows: int, columns: int) -> str:
+    """Integer, double and varchar columns in turn, ``columns`` wide."""
+    expressions = []
+    for i in range(columns):
+        if i % 3 == 0:
+            expressions.append(f"range + {i} as c{i}")
+        elif i % 3 == 1:
+            expressions.append(f"random() as c{i}")
+        else:
+            expressions.append(f"'value-' || (range % 1000) as c{i}")
+    return f"select {', '.join(expressions)} from range({rows})"
+
+
+def timed(
+    url, concurrency: int, iterations: int, call: Callable[[Client], int]
+) -> dict:
+    """Run ``call`` ``iterations`` times on each of ``concurrency`` clients.
+
+    ``call`` returns the number of bytes it moved.
+    """
+    clients = [Client(url) for _ in range(concurrency)]
+    latencies, nbytes = [], 0
+    lock = threading.Lock()
+
+    def worker(client: Client):
+        nonlocal nbytes
+        for _ in range(iterations):
+            start = time.perf_counter()
+            moved = call(client)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                nbytes += moved
+
+    # one warm up call so connection setup isn't measured
+    for client in clients:
+        call(client)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, clients))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return summarize(latencies, nbytes, elapsed)
+
+
+def operations(name: str, table: pa.Table, batch_bytes: int) -> dict:
+    query = f"select * from {name} where c0 % 10 = 0"
+    return {
+        "list_flights": lambda c: len(list(c.list_flights())) and 0,
+        "get_flight_info": lambda c: c.get_flight_info_for_table(name) and 0,
+        "read_table": lambda c: c.read_table(name).nbytes,
+        "read_query": lambda c: c.read_query(query).nbytes,
+        "do_put": lambda c: c.do_put(
+            f"{name}_put", table, batch_bytes=batch_bytes
+        ).nbytes,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--batch-bytes", type=int, nargs="+", default=[1 << 20, 8 << 20, 32 << 20]
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--operations", nargs="+", default=OPERATIONS, choices=OPERATIONS
+    )
+    parser.add_argument("--output", help="write the results as json to this file")
+    args = parser.parse_args()
+    # per call info logs would dominate the output
+    logging.getLogger("ruddy").setLevel(logging.WARNING)
+
+    results = []
+    print(
+        f"{'operation':>16} {'rows':>9} {'conc':>4} {'batch MB':>8} {'p50 ms':>9} "
+        f"{'p90 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'GB/s':>7}"
+    )
+    with LocalServer() as server:
+        for rows in args.rows:
+            name = f"bench_{rows}_{args.columns}"
+            with Client(server.url) as client:
+                client.read_query(
+                    f"create or replace table {name} as "
+                    f"{table_query(rows, args.columns)}"
+                )
+                table = client.read_table(name)
+
+            for operation in args.operations:
+                sizes = args.batch_bytes if operation == "do_put" else [None]
+                for batch_bytes in sizes:
+                    call = operations(name, table, batch_bytes)[operation]
+                    for concurrency in args.concurrency:
+                        # uploads are large, keep their runs short
+                        iterations = args.iterations
+                        if operation == "do_put":
+                            iterations = max(1, iterations // 4)
+                        result = {
+                            "operation": operation,
+                            "rows": rows,
+                            "columns": args.columns,
+                            "concurrency": concurrency,
+                            "batch_bytes": batch_bytes,
+                            **timed(server.url, concurrency, iterations, call),
+                        }
+                        results.append(result)
+                        batch_mb = (batch_bytes or 0) / (1 << 20)
+                        print(
+                            f"{operation:>16} {rows:>9} {concurrency:>4} "
+                            f"{batch_mb:>8.0f} {result['p50_ms']:>9.2f} "
+                            f"{result['p90_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                            f"{result['ops_per_s']:>9.1f} {result['gb_per_s']:>7.3f}"
+                        )
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.time(),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "pyarrow": pa.__version__,
+                "duckdb": duckdb.__version__,
+                "iterations": args.iterations,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Per call cost of encoding and decoding tickets in both formats.
+
+    python src/benchmarks/bench_ticket.py
+"""
+
+import argparse
+import timeit
+
+from ruddy.models.table import Table
+from ruddy.models.ticket_wrapper import TicketWrapper
+
+
+def tickets() -> dict[str, TicketWrapper]:
+    table = Table(name="events", catalog_name="warehouse", schema_name="main")
+    partitioned = TicketWrapper.from_table(table, partition=(1_000_000, 2_000_000))
+    partitioned.columns = ["id", "ts", "payload"]
+    return {
+        "command": TicketWrapper.from_command("select * from events where id = 42"),
+        "table": TicketWrapper.from_table(table),
+        "table+pushdown": partitioned,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'ticket':>16} {'format':>8} {'bytes':>6} {'encode us':>10} {'decode us':>10}")
+    for name, tw in tickets().items():
+        for compact in (False, True):
+            data = tw.serialize(compact=compact)
+            encode = timeit.timeit(lambda: tw.serialize(compact=compact), number=args.number)
+            decode = timeit.timeit(lambda: TicketWrapper.deserialize(data), number=args.number)
+            print(
+                f"{name:>16} {'compact' if compact else 'json':>8} {len(data):>6} "
+                f"{encode / args.number * 1e6:>10.2f} {decode / args.number * 1e6:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import math
+import socket
+import threading
+import time
+
+import pyarrow.flight as flight
+
+from ruddy.models.ticket_wrapper import TicketWrapper
+from ruddy.server.server import Server
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(client: flight.FlightClient, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client.do_get(TicketWrapper.ticket_from_command("select 1")).read_all()
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class LocalServer:
+    """A Server on a free localhost port, served from a background thread."""
+
+    def __init__(self, query: str = ""):
+        self.server = Server(f"grpc://localhost:{free_port()}{query}")
+        self.thread = threading.Thread(target=self.server.serve)
+
+    @property
+    def backend(self):
+        return self.server.backend
+
+    @property
+    def url(self):
+        return self.server.url
+
+    def __enter__(self) -> "LocalServer":
+        self.thread.start()
+        wait_for_server(flight.FlightClient(self.server.url.location))
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def percentile(values: list[float], q: float) -> float:
+    """``q``-th percentile, 0 to 100, interpolated between the closest ranks."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies: list[float], nbytes: int, elapsed: float) -> dict:
+    """Latency percentiles in milliseconds and throughput of a timed run."""
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "ops_per_s": len(latencies) / elapsed,
+        "gb_per_s": nbytes / 1e9 / elapsed,
+    }
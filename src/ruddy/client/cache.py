@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.flight as flight
+
+from ruddy.utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def version_of(flight_info: flight.FlightInfo) -> str | None:
+    """Version token the server put in the app metadata, if any."""
+    if not flight_info.app_metadata:
+        return None
+    try:
+        return json.loads(flight_info.app_metadata).get("version")
+    except ValueError:
+        return None
+
+
+class Entry:
+    def __init__(self, version: str, data: pa.Buffer | str, nbytes: int):
+        self.version = version
+        # ipc stream in memory, or the path of an ipc file on disk
+        self.data = data
+        self.nbytes = nbytes
+
+
+class LocalCache:
+    """Client side cache of read results, revalidated by version tokens.
+
+    Results are kept as Arrow IPC, in memory or as files under ``directory``,
+    up to ``max_bytes`` with the least recently used evicted first. A result
+    is only served while the server reports the same version and schema for
+    it, files left by an earlier process are picked up again.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, directory: str = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = LRUCache(
+            max_weight=max_bytes,
+            weigher=lambda entry: entry.nbytes,
+            on_evict=self.evicted,
+        )
+        self.revalidations = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.load()
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        encoded = json.dumps(parts, default=str, sort_keys=True)
+        return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+    def path(self, key: str, version: str) -> str:
+        return os.path.join(self.directory, f"{key}-{version}.arrow")
+
+    def load(self):
+        files = [f for f in os.listdir(self.directory) if f.endswith(".arrow")]
+        paths = sorted(
+            (os.path.join(self.directory, f) for f in files), key=os.path.getmtime
+        )
+        for path in paths:
+            key, _, version = os.path.basename(path)[: -len(".arrow")].partition("-")
+            self.entries.put(key, Entry(version, path, os.path.getsize(path)))
+
+    def get(self, key: str, version: str, schema: pa.Schema = None) -> pa.Table | None:
+        entry: Entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version:
+            self.revalidations += 1
+            self.drop(key)
+            return None
+
+        if isinstance(entry.data, str):
+            table = pa.ipc.open_file(pa.memory_map(entry.data)).read_all()
+        else:
+            table = pa.ipc.open_stream(entry.data).read_all()
+        if schema is not None and not table.schema.equals(schema, check_metadata=False):
+            self.drop(key)
+            return None
+        return table
+
+    def put(self, key: str, version: str, table: pa.Table):
+        if table.nbytes > self.max_bytes:
+            return
+        self.drop(key)
+        if self.directory:
+            path = self.path(key, version)
+            tmp = f"{path}.tmp"
+            with pa.OSFile(tmp, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp, path)
+            entry = Entry(version, path, os.path.getsize(path))
+        else:
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            buffer = sink.getvalue()
+            entry = Entry(version, buffer, buffer.size)
+        self.entries.put(key, entry)
+
+    def drop(self, key: str):
+        if (entry := self.entries.pop(key)) is not None:
+            self.evicted(key, entry)
+
+    def evicted(self, key: str, entry: Entry):
+        if isinstance(entry.data, str) and os.path.exists(entry.data):
+            os.remove(entry.data)
+
+    def clear(self):
+        for key in self.entries.keys():
+            self.drop(key)
+
+    def stats(self) -> dict:
+        return {**self.entries.stats(), "revalidations": self.revalidations}
@@ -1,14 +1,28 @@
+import asyncio
 import functools
+import json
 import logging
+import threading
+import time
 import uuid
-from typing import Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Generator, Iterable
 
 import pyarrow as pa
 import pyarrow.flight as flight
 
-from ruddy.client.middleware import CoreMiddlewareFactory
+from ruddy.client.cache import LocalCache, version_of
+from ruddy.client.middleware import CoreMiddlewareFactory, MetricsMiddlewareFactory
+from ruddy.client.prepared_statement import PreparedStatement
+from ruddy.models.file_transfer import ExportQuery, ImportFiles
+from ruddy.models.filter import Filter
+from ruddy.models.put_progress import FLUSH, PutProgress
 from ruddy.models.table import Table
+from ruddy.models.ticket_wrapper import TicketWrapper
+from ruddy.models.watermark import Watermark
 from ruddy.url import URL
+from ruddy.utils import ipc
+from ruddy.utils.batches import BatchSource, rechunk, with_schema
 
 logger = logging.getLogger(__name__)
 
@@ -23,18 +37,66 @@ def request(func):
     return wrapper
 
 
+def chain(source: Future, target: Future):
+    try:
+        target.set_result(source.result())
+    except Exception as e:
+        target.set_exception(e)
+
+
 class Client:
-    def __init__(self, url: str | URL):
+    def __init__(
+        self,
+        url: str | URL,
+        max_workers: int = 8,
+        compression: str = None,
+        cache: LocalCache = None,
+    ):
         self.url = URL.init(url)
-        headers = {"database": self.url.database, "schema": self.url.schema}
+        self.max_workers = max_workers
+        # opt in, read_table and read_query results revalidated by version
+        self.cache = cache
+        # asked from the server for results and used for uploads, "none" turns
+        # off a server side default
+        self.compression = compression or self.url.compression
+        self.call_options = flight.FlightCallOptions(
+            write_options=ipc.write_options(self.compression)
+        )
+        headers = {
+            "database": self.url.database,
+            "schema": self.url.schema,
+            "compression": self.compression,
+        }
         self.core_middleware = CoreMiddlewareFactory(output_headers=headers)
+        self.metrics_middleware = MetricsMiddlewareFactory()
         self.client = flight.FlightClient(
             self.url.location,
-            middleware=[self.core_middleware],
+            middleware=[self.core_middleware, self.metrics_middleware],
+        )
+        # endpoints served by other servers, e.g. the nodes behind a coordinator
+        self.nodes: dict[str, flight.FlightClient] = {}
+        self.nodes_lock = threading.Lock()
+        # shared by all concurrent reads, bounds the number of calls in flight
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ruddy-client"
         )
         logger.debug(f"Initialized client with {self.url.string()}")
 
-    def to_table(self, name: str) -> Table:
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+        self.client.close()
+        for node in self.nodes.values():
+            node.close()
+
+    def to_table(self, name: str | Table) -> Table:
+        if isinstance(name, Table):
+            return name
         path = name.split(".")
         defaults = {}
         if self.url.database:
@@ -56,45 +118,558 @@ class Client:
         descriptor = flight.FlightDescriptor.for_command(command)
         return self.client.get_flight_info(descriptor)
 
-    def table_reader(self, name: str) -> flight.FlightStreamReader:
+    def client_for(self, endpoint: flight.FlightEndpoint) -> flight.FlightClient:
+        """Client for the server holding ``endpoint``, by its first location."""
+        if not endpoint.locations:
+            return self.client
+        location = endpoint.locations[0].uri.decode("utf-8")
+        if location == self.url.location:
+            return self.client
+        with self.nodes_lock:
+            if location not in self.nodes:
+                self.nodes[location] = flight.FlightClient(
+                    location,
+                    middleware=[self.core_middleware, self.metrics_middleware],
+                )
+            return self.nodes[location]
+
+    def flight_info_reader(
+        self, flight_info: flight.FlightInfo
+    ) -> flight.FlightStreamReader | pa.RecordBatchReader:
+        """Reader over all endpoints of ``flight_info``, one after the other."""
+        endpoints = flight_info.endpoints
+        first: flight.FlightStreamReader = self.client_for(endpoints[0]).do_get(
+            endpoints[0].ticket
+        )
+        if len(endpoints) == 1:
+            return first
+
+        def batches():
+            yield from first.to_reader()
+            for endpoint in endpoints[1:]:
+                yield from self.client_for(endpoint).do_get(endpoint.ticket).to_reader()
+
+        return pa.RecordBatchReader.from_batches(first.schema, batches())
+
+    def read_endpoint(self, endpoint: flight.FlightEndpoint) -> pa.Table:
+        reader = self.client_for(endpoint).do_get(endpoint.ticket)
+        return self.received(reader.read_all())
+
+    def received(self, table: pa.Table) -> pa.Table:
+        metrics = self.metrics_middleware.metrics
+        metrics.inc("ruddy_client_rows_received_total", table.num_rows, method="do_get")
+        metrics.inc("ruddy_client_bytes_received_total", table.nbytes, method="do_get")
+        return table
+
+    def read_flight_info(self, flight_info: flight.FlightInfo) -> pa.Table:
+        """Fetch all endpoints of ``flight_info`` concurrently, in endpoint order."""
+        endpoints = flight_info.endpoints
+        if len(endpoints) == 1:
+            return self.read_endpoint(endpoints[0])
+        return self.gather_endpoints(endpoints, flight_info.schema).result()
+
+    def gather_endpoints(
+        self, endpoints: list[flight.FlightEndpoint], schema: pa.Schema
+    ) -> Future:
+        """Submit a read per endpoint, the future resolves to their concatenation."""
+        result = Future()
+        if not endpoints:
+            result.set_result(schema.empty_table())
+            return result
+        futures = [self.executor.submit(self.read_endpoint, e) for e in endpoints]
+        remaining = len(futures)
+        lock = threading.Lock()
+
+        def on_done(_):
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                if remaining:
+                    return
+            try:
+                result.set_result(pa.concat_tables([f.result() for f in futures]))
+            except Exception as e:
+                result.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(on_done)
+        return result
+
+    def submit_read(self, get_flight_info: Callable[[], flight.FlightInfo]) -> Future:
+        """Pipeline a metadata call and the data calls it leads to.
+
+        Nothing blocks on the executor: the endpoint reads are submitted from a
+        callback once the flight info arrives, so any number of reads can be
+        in flight with a bounded pool.
+        """
+        result = Future()
+
+        def on_flight_info(future: Future):
+            try:
+                flight_info = future.result()
+                gathered = self.gather_endpoints(
+                    flight_info.endpoints, flight_info.schema
+                )
+            except Exception as e:
+                result.set_exception(e)
+                return
+            gathered.add_done_callback(lambda f: chain(f, result))
+
+        self.executor.submit(get_flight_info).add_done_callback(on_flight_info)
+        return result
+
+    def read_tables(self, names: Iterable[str]) -> dict[str, pa.Table]:
+        futures = {
+            name: self.submit_read(functools.partial(self.get_flight_info_for_table, name))
+            for name in names
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def read_queries(self, queries: Iterable[str]) -> list[pa.Table]:
+        futures = [
+            self.submit_read(functools.partial(self.get_flight_info_for_command, query))
+            for query in queries
+        ]
+        return [future.result() for future in futures]
+
+    async def read_table_async(self, name: str) -> pa.Table:
+        return await asyncio.wrap_future(
+            self.submit_read(functools.partial(self.get_flight_info_for_table, name))
+        )
+
+    async def read_query_async(self, query: str) -> pa.Table:
+        return await asyncio.wrap_future(
+            self.submit_read(functools.partial(self.get_flight_info_for_command, query))
+        )
+
+    def get_flight_info_for_table(self, name: str) -> flight.FlightInfo:
         table = self.to_table(name)
-        flight_info = self.get_flight_info_for_path(
+        return self.get_flight_info_for_path(
             table.database_or_default(),
             table.schema_or_default(),
             table.name,
         )
-        reader: flight.FlightStreamReader = self.client.do_get(
-            flight_info.endpoints[0].ticket
+
+    def with_pushdown(
+        self,
+        flight_info: flight.FlightInfo,
+        columns: list[str] = None,
+        filters: list[Filter | tuple] = None,
+        limit: int = None,
+    ) -> flight.FlightInfo:
+        """Copy of a table ``flight_info`` whose tickets carry the pushdowns.
+
+        ``filters`` are ``(column, op, value)`` tuples, values are bound as
+        query parameters on the server. The limit applies per endpoint.
+        """
+        if columns is None and filters is None and limit is None:
+            return flight_info
+
+        endpoints = []
+        for endpoint in flight_info.endpoints:
+            tw = TicketWrapper.deserialize(endpoint.ticket.ticket)
+            tw.columns = columns
+            tw.filters = None if filters is None else [Filter.init(f) for f in filters]
+            tw.limit = limit
+            endpoints.append(flight.FlightEndpoint(tw.ticket, endpoint.locations))
+
+        schema = flight_info.schema
+        if columns:
+            schema = pa.schema([schema.field(c) for c in columns])
+        return flight.FlightInfo(
+            schema,
+            flight_info.descriptor,
+            endpoints,
+            -1,
+            -1,
+            app_metadata=flight_info.app_metadata,
         )
-        return reader
 
-    def read_table(self, table: str) -> pa.Table:
-        reader = self.table_reader(table)
-        return reader.read_all()
+    def table_reader(
+        self,
+        name: str,
+        columns: list[str] = None,
+        filters: list[Filter | tuple] = None,
+        limit: int = None,
+    ) -> flight.FlightStreamReader | pa.RecordBatchReader:
+        flight_info = self.get_flight_info_for_table(name)
+        return self.flight_info_reader(
+            self.with_pushdown(flight_info, columns, filters, limit)
+        )
 
-    def query_reader(self, query: str) -> flight.FlightStreamReader:
-        flight_info = self.get_flight_info_for_command(query)
-        reader: flight.FlightStreamReader = self.client.do_get(
-            flight_info.endpoints[0].ticket
+    def read_table(
+        self,
+        table: str,
+        columns: list[str] = None,
+        filters: list[Filter | tuple] = None,
+        limit: int = None,
+    ) -> pa.Table:
+        flight_info = self.with_pushdown(
+            self.get_flight_info_for_table(table), columns, filters, limit
         )
-        return reader
+        key = ("table", table, columns, filters, limit)
+        if (cached := self.from_cache(flight_info, key)) is not None:
+            return cached
+
+        result = self.read_flight_info(flight_info)
+        if limit is not None:
+            result = result.slice(0, limit)
+        self.to_cache(flight_info, key, result)
+        return result
+
+    @request
+    def read_table_since(
+        self, table: str, watermark: str = None
+    ) -> tuple[pa.Table, str]:
+        """Rows appended to ``table`` after ``watermark``, and the next watermark.
+
+        Without a watermark, or once the table was rewritten, the whole table
+        is read. Rows appended while reading are left for the next call.
+        Sharded tables have no single watermark, a coordinator can't serve it.
+        """
+        flight_info = self.get_flight_info_for_table(table)
+        metadata = json.loads(flight_info.app_metadata or b"{}")
+        if "watermark" not in metadata:
+            raise ValueError(
+                f"{table} has no watermark, read_table_since needs a single server"
+            )
+        current = Watermark.deserialize(metadata["watermark"])
+        since = None if watermark is None else Watermark.deserialize(watermark)
+        if not current.follows(since):
+            since = None
+
+        endpoint = flight_info.endpoints[0]
+        tw = TicketWrapper.deserialize(endpoint.ticket.ticket)
+        tw.partition = (0 if since is None else since.rows, current.rows)
+        tw.since = None if since is None else since.serialize()
+        try:
+            result = self.read_endpoint(
+                flight.FlightEndpoint(tw.ticket, endpoint.locations)
+            )
+        except pa.ArrowInvalid:
+            # rewritten after the flight info was fetched
+            if since is None:
+                raise
+            return self.read_table_since(table)
+        return result, current.serialize()
+
+    def subscribe(self, table: str) -> Generator[pa.RecordBatch, None, None]:
+        """Batches committed to ``table`` by do_put from now on, as they commit.
+
+        The stream stays open until the generator is closed or the server
+        cuts the subscriber off for falling too far behind, then
+        ``read_table_since`` catches up on what was missed.
+        """
+        tw = TicketWrapper.from_subscription(self.to_table(table))
+        reader = self.client.do_get(tw.ticket)
+        try:
+            for chunk in reader:
+                yield self.received(chunk.data)
+        finally:
+            reader.cancel()
+
+    def query_reader(
+        self, query: str
+    ) -> flight.FlightStreamReader | pa.RecordBatchReader:
+        return self.flight_info_reader(self.get_flight_info_for_command(query))
 
     @request
     def read_query(self, query: str) -> pa.Table:
-        reader = self.query_reader(query)
-        return reader.read_all()
+        flight_info = self.get_flight_info_for_command(query)
+        key = ("query", query)
+        if (cached := self.from_cache(flight_info, key)) is not None:
+            return cached
+
+        result = self.read_flight_info(flight_info)
+        self.to_cache(flight_info, key, result)
+        return result
+
+    def from_cache(self, flight_info: flight.FlightInfo, key: tuple) -> pa.Table | None:
+        if self.cache is None or (version := version_of(flight_info)) is None:
+            return None
+        return self.cache.get(
+            LocalCache.key(self.url.string(), *key), version, flight_info.schema
+        )
+
+    def to_cache(self, flight_info: flight.FlightInfo, key: tuple, table: pa.Table):
+        if self.cache is None or (version := version_of(flight_info)) is None:
+            return
+        self.cache.put(LocalCache.key(self.url.string(), *key), version, table)
 
     @request
-    def do_put(self, name: str, data: pa.Table):
+    def do_put(
+        self,
+        name: str,
+        data: BatchSource,
+        schema: pa.Schema = None,
+        batch_bytes: int = 8 * 1024 * 1024,
+        streams: int = 1,
+        max_unacked_bytes: int = None,
+        on_progress: Callable[[PutProgress], None] = None,
+    ) -> PutProgress:
+        """Upload ``data`` into table ``name``.
+
+        ``data`` may be a table, a record batch reader or any iterable of
+        record batches, it is re-chunked to about ``batch_bytes`` per batch.
+        With ``streams`` > 1 the batches are spread over that many concurrent
+        do_put calls into the same table. ``max_unacked_bytes`` pauses a stream
+        until the server commits, the batch that fills the window asks the
+        server to commit right away. ``on_progress`` is called with the total committed so
+        far after every acknowledgement.
+        """
         table = self.to_table(name)
         descriptor = flight.FlightDescriptor.for_path(
             table.database_or_default(),
             table.schema_or_default(),
             table.name,
         )
-        writer, _ = self.client.do_put(descriptor, data.schema)
-        writer.write_table(data)
-        writer.close()
+        schema, batches = with_schema(data, schema)
+        batches = rechunk(batches, batch_bytes)
+
+        lock = threading.Lock()
+        acked: dict[int, PutProgress] = {}
+
+        def next_batch() -> pa.RecordBatch | None:
+            with lock:
+                return next(batches, None)
+
+        def on_ack(stream: int, progress: PutProgress):
+            # reported under the lock so totals reach the callback in order
+            with lock:
+                acked[stream] = progress
+                if on_progress:
+                    on_progress(
+                        PutProgress(
+                            rows=sum(p.rows for p in acked.values()),
+                            nbytes=sum(p.nbytes for p in acked.values()),
+                        )
+                    )
+
+        def put(stream: int, source=next_batch) -> PutProgress:
+            return self.put_stream(
+                descriptor,
+                schema,
+                source,
+                functools.partial(on_ack, stream),
+                max_unacked_bytes,
+            )
+
+        if streams > 1:
+            # the first batch creates the table, concurrent creates would conflict
+            first = iter([next(batches, None)])
+            put(0, lambda: next(first, None))
+            with ThreadPoolExecutor(max_workers=streams) as executor:
+                list(executor.map(put, range(1, streams + 1)))
+        else:
+            put(0)
+
+        progress = PutProgress(
+            rows=sum(p.rows for p in acked.values()),
+            nbytes=sum(p.nbytes for p in acked.values()),
+        )
+        metrics = self.metrics_middleware.metrics
+        metrics.inc("ruddy_client_rows_sent_total", progress.rows, method="do_put")
+        metrics.inc("ruddy_client_bytes_sent_total", progress.nbytes, method="do_put")
+        return progress
+
+    @request
+    def exchange(
+        self, query: str, data: BatchSource, schema: pa.Schema = None
+    ) -> pa.Table:
+        """Run ``query`` on the server over ``data``, in a single call.
+
+        ``data`` is the ``input`` relation of the query, e.g. ``SELECT ...
+        FROM input JOIN items USING (id)``. It streams up while the result
+        streams back, nothing is written to a table in between.
+        """
+        descriptor = flight.FlightDescriptor.for_command(query)
+        schema, batches = with_schema(data, schema)
+        writer, reader = self.client.do_exchange(descriptor, options=self.call_options)
+        sent = PutProgress()
+
+        def send():
+            try:
+                writer.begin(schema)
+                for batch in batches:
+                    writer.write_batch(batch)
+                    sent.rows += batch.num_rows
+                    sent.nbytes += batch.nbytes
+            finally:
+                writer.done_writing()
+
+        # written concurrently, a large input and result would otherwise
+        # both wait on flow control
+        sender = self.executor.submit(send)
+        try:
+            result = reader.read_all()
+            sender.result()
+        finally:
+            writer.close()
+
+        metrics = self.metrics_middleware.metrics
+        metrics.inc("ruddy_client_rows_sent_total", sent.rows, method="do_exchange")
+        metrics.inc("ruddy_client_bytes_sent_total", sent.nbytes, method="do_exchange")
+        metrics.inc(
+            "ruddy_client_rows_received_total", result.num_rows, method="do_exchange"
+        )
+        metrics.inc(
+            "ruddy_client_bytes_received_total", result.nbytes, method="do_exchange"
+        )
+        return result
+
+    def put_stream(
+        self,
+        descriptor: flight.FlightDescriptor,
+        schema: pa.Schema,
+        next_batch: Callable[[], pa.RecordBatch | None],
+        on_ack: Callable[[PutProgress], None],
+        max_unacked_bytes: int = None,
+    ) -> PutProgress:
+        writer, metadata_reader = self.client.do_put(
+            descriptor, schema, options=self.call_options
+        )
+        available = threading.Condition()
+        acked, finished = PutProgress(), False
+
+        # the server acknowledges every commit with the cumulative progress
+        def read_acks():
+            nonlocal acked, finished
+            try:
+                while (buf := metadata_reader.read()) is not None:
+                    progress = PutProgress.deserialize(buf)
+                    with available:
+                        acked = progress
+                        available.notify_all()
+                    on_ack(progress)
+            except flight.FlightError as e:
+                logger.debug(f"Stopped reading acknowledgements: {e}")
+            finally:
+                with available:
+                    finished = True
+                    available.notify_all()
+
+        reader_thread = threading.Thread(target=read_acks, daemon=True)
+        reader_thread.start()
+        sent = 0
+        try:
+            while (batch := next_batch()) is not None:
+                if not max_unacked_bytes:
+                    writer.write_batch(batch)
+                    continue
+                with available:
+                    full = sent + batch.nbytes - acked.nbytes >= max_unacked_bytes
+                if full:
+                    # without it the server only commits at its own thresholds
+                    writer.write_with_metadata(batch, pa.py_buffer(FLUSH))
+                else:
+                    writer.write_batch(batch)
+                sent += batch.nbytes
+                with available:
+                    available.wait_for(
+                        lambda: finished or sent - acked.nbytes < max_unacked_bytes
+                    )
+            writer.done_writing()
+            reader_thread.join()
+        finally:
+            writer.close()
+        return acked
+
+    def do_action(self, action_type: str, body: str | bytes = b"") -> list[bytes]:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        results = self.client.do_action(flight.Action(action_type, body))
+        return [result.body.to_pybytes() for result in results]
+
+    def server_metrics(self) -> str:
+        """The server's metrics in Prometheus text format."""
+        (result,) = self.do_action("metrics")
+        return result.decode("utf-8")
+
+    def place(self, table: str, shard_key: str) -> dict:
+        """Shard ``table`` on ``shard_key``, on a coordinator before the first put."""
+        table = self.to_table(table)
+        path = [table.database_or_default(), table.schema_or_default(), table.name]
+        body = json.dumps({"path": path, "shard_key": shard_key})
+        (result,) = self.do_action("place", body)
+        return json.loads(result)
+
+    def prepare(self, query: str) -> PreparedStatement:
+        return PreparedStatement(self, query)
+
+    def submit_job(self, query: str) -> str:
+        """Run ``query`` in the background on the server, returns the job id."""
+        (result,) = self.do_action("submit-job", query)
+        return json.loads(result)["id"]
+
+    def job_status(self, job_id: str) -> dict:
+        (result,) = self.do_action("job-status", job_id)
+        return json.loads(result)
+
+    def cancel_job(self, job_id: str) -> dict:
+        (result,) = self.do_action("cancel-job", job_id)
+        return json.loads(result)
+
+    def wait_job(
+        self, job_id: str, timeout: float = None, interval: float = 0.1
+    ) -> dict:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (status := self.job_status(job_id))["state"] in ("pending", "running"):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} is still {status['state']}")
+            time.sleep(interval)
+        return status
+
+    def job_result(self, job_id: str) -> pa.Table:
+        (ticket,) = self.do_action("job-result", job_id)
+        return self.client.do_get(flight.Ticket(ticket)).read_all()
+
+    def import_files(
+        self,
+        table: str | list[str],
+        path: str | list[str],
+        format: str = None,
+        mode: str = "append",
+        options: dict = None,
+        background: bool = False,
+    ) -> int | str:
+        """Load files on the server's disk into ``table``.
+
+        Returns the number of rows loaded, or the job id when ``background``.
+        """
+        request = ImportFiles(
+            table=table,
+            path=path,
+            format=format,
+            mode=mode,
+            options=options or {},
+            background=background,
+        )
+        return self.transfer_files("import", request)
+
+    def export_query(
+        self,
+        query: str,
+        path: str,
+        format: str = "parquet",
+        partition_by: list[str] = None,
+        options: dict = None,
+        background: bool = False,
+    ) -> int | str:
+        """Write the result of ``query`` to files on the server's disk.
+
+        Returns the number of rows written, or the job id when ``background``.
+        """
+        request = ExportQuery(
+            query=query,
+            path=path,
+            format=format,
+            partition_by=partition_by,
+            options=options or {},
+            background=background,
+        )
+        return self.transfer_files("export", request)
 
-    def do_action(self):
-        pass
+    def transfer_files(self, action_type: str, request: ImportFiles | ExportQuery):
+        (result,) = self.do_action(action_type, request.model_dump_json())
+        result = json.loads(result)
+        return result["id"] if request.background else result["rows"]
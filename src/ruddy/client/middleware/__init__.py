@@ -1 +1,2 @@
 from ruddy.client.middleware.core_middleware import CoreMiddlewareFactory
+from ruddy.client.middleware.metrics_middleware import MetricsMiddlewareFactory
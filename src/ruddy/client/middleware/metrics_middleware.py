@@ -0,0 +1,40 @@
+import time
+
+import pyarrow.flight as flight
+
+from ruddy.utils.metrics import Metrics
+
+
+def client_metrics() -> Metrics:
+    metrics = Metrics()
+    metrics.counter("ruddy_client_calls_total", "Flight calls by method and status.")
+    metrics.histogram("ruddy_client_rpc_seconds", "Latency of flight calls.")
+    metrics.counter("ruddy_client_rows_received_total", "Rows read from the server.")
+    metrics.counter("ruddy_client_bytes_received_total", "Arrow bytes read.")
+    metrics.counter("ruddy_client_rows_sent_total", "Rows committed by the server.")
+    metrics.counter("ruddy_client_bytes_sent_total", "Arrow bytes committed.")
+    return metrics
+
+
+class MetricsMiddleware(flight.ClientMiddleware):
+    def __init__(self, metrics: Metrics, method: str):
+        self.metrics = metrics
+        self.method = method
+        self.started = time.perf_counter()
+
+    def call_completed(self, exception):
+        status = "ok" if exception is None else type(exception).__name__
+        self.metrics.inc("ruddy_client_calls_total", method=self.method, status=status)
+        self.metrics.observe(
+            "ruddy_client_rpc_seconds",
+            time.perf_counter() - self.started,
+            method=self.method,
+        )
+
+
+class MetricsMiddlewareFactory(flight.ClientMiddlewareFactory):
+    def __init__(self, metrics: Metrics = None):
+        self.metrics = metrics or client_metrics()
+
+    def start_call(self, info):
+        return MetricsMiddleware(self.metrics, info.method.name.lower())
@@ -0,0 +1,66 @@
+import json
+from typing import TYPE_CHECKING, Any
+
+import pyarrow as pa
+import pyarrow.flight as flight
+
+from ruddy.models.ticket_wrapper import TicketWrapper
+
+if TYPE_CHECKING:
+    from ruddy.client.client import Client
+
+Parameters = pa.Table | pa.RecordBatch | dict[str, Any] | list | tuple | None
+
+
+def to_parameters(parameters: Parameters) -> pa.Table | pa.RecordBatch | None:
+    """Positional parameters as an arrow table with one row per execution.
+
+    A dict of lists is several rows, a dict of scalars or a list of values
+    is a single row.
+    """
+    if parameters is None or isinstance(parameters, (pa.Table, pa.RecordBatch)):
+        return parameters
+    if isinstance(parameters, dict):
+        if all(isinstance(v, (list, tuple)) for v in parameters.values()):
+            return pa.table(parameters)
+        return pa.table({k: [v] for k, v in parameters.items()})
+    return pa.table({f"p{i}": [v] for i, v in enumerate(parameters)})
+
+
+class PreparedStatement:
+    """A query prepared on the server, executed by handle with new parameters."""
+
+    def __init__(self, client: "Client", query: str):
+        self.client = client
+        self.query = query
+        self.handle = None
+        self.prepare()
+
+    def __enter__(self) -> "PreparedStatement":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def prepare(self):
+        (result,) = self.client.do_action("prepare", self.query)
+        self.handle = json.loads(result)["handle"]
+
+    def reader(self, parameters: Parameters = None) -> flight.FlightStreamReader:
+        ticket = TicketWrapper.from_prepared(self.handle, to_parameters(parameters))
+        return self.client.client.do_get(ticket.ticket)
+
+    def execute(self, parameters: Parameters = None) -> pa.Table:
+        try:
+            return self.reader(parameters).read_all()
+        except (flight.FlightError, KeyError) as e:
+            # the server evicted the statement, prepare it again once
+            if "Unknown prepared statement" not in str(e):
+                raise
+            self.prepare()
+            return self.reader(parameters).read_all()
+
+    def close(self):
+        if self.handle is not None:
+            self.client.do_action("close-prepared", self.handle)
+            self.handle = None
@@ -2,17 +2,19 @@ import pyarrow.flight as flight
 from pydantic import BaseModel
 
 from ruddy.models.table import Table
-from ruddy.models.ticket_wrapper import TicketWrapper
+from ruddy.models.ticket_wrapper import Partition, TicketWrapper
 
 
 class EndpointWrapper(BaseModel, arbitrary_types_allowed=True):
     flight_endpoint: flight.FlightEndpoint
 
     @classmethod
-    def from_table(cls, table: Table, locations: list) -> "EndpointWrapper":
+    def from_table(
+        cls, table: Table, locations: list, partition: Partition = None
+    ) -> "EndpointWrapper":
         return cls(
             flight_endpoint=flight.FlightEndpoint(
-                TicketWrapper.ticket_from_table(table),
+                TicketWrapper.ticket_from_table(table, partition),
                 locations=locations,
             )
         )
@@ -0,0 +1,86 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel, field_validator
+
+IMPORT_FORMATS = {"parquet", "csv", "ipc"}
+EXPORT_FORMATS = {"parquet", "csv"}
+
+EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".arrow": "ipc",
+    ".ipc": "ipc",
+    ".feather": "ipc",
+}
+
+
+def guess_format(path: str) -> str:
+    name = path.lower()
+    for suffix in (".gz", ".zst"):
+        name = name.removesuffix(suffix)
+    for extension, file_format in EXTENSIONS.items():
+        if name.endswith(extension):
+            return file_format
+    raise ValueError(f"Can't tell the file format of '{path}', specify one")
+
+
+class ImportFiles(BaseModel):
+    """Load server side files, or globs of them, into a table."""
+
+    # table name or [database, schema, name] path like a flight descriptor
+    table: str | list[str]
+    path: str | list[str]
+    format: Optional[str] = None
+    # append to the table, creating it if needed, or replace it
+    mode: str = "append"
+    # passed to the DuckDB reader, e.g. {"header": true, "delim": ";"}
+    options: dict[str, Any] = {}
+    background: bool = False
+
+    @field_validator("format")
+    @classmethod
+    def validate_format(cls, value: str | None) -> str | None:
+        if value is not None and value.lower() not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported import format '{value}'")
+        return value and value.lower()
+
+    @field_validator("mode")
+    @classmethod
+    def validate_mode(cls, value: str) -> str:
+        if value not in ("append", "replace"):
+            raise ValueError(f"Unsupported import mode '{value}'")
+        return value
+
+    @property
+    def paths(self) -> list[str]:
+        return [self.path] if isinstance(self.path, str) else self.path
+
+    @property
+    def file_format(self) -> str:
+        return self.format or guess_format(self.paths[0])
+
+    @property
+    def table_path(self) -> list[str]:
+        return [self.table] if isinstance(self.table, str) else self.table
+
+
+class ExportQuery(BaseModel):
+    """Write the result of a query to server side files."""
+
+    query: str
+    path: str
+    format: str = "parquet"
+    # hive partitioned output directory, one sub directory per value
+    partition_by: Optional[list[str]] = None
+    # passed to DuckDB's COPY, e.g. {"compression": "zstd"}
+    options: dict[str, Any] = {}
+    background: bool = False
+
+    @field_validator("format")
+    @classmethod
+    def validate_format(cls, value: str) -> str:
+        if value.lower() not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format '{value}'")
+        return value.lower()
@@ -0,0 +1,66 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel, field_validator
+
+OPERATORS = {
+    "=",
+    "!=",
+    "<",
+    "<=",
+    ">",
+    ">=",
+    "like",
+    "not like",
+    "in",
+    "not in",
+    "is null",
+    "is not null",
+}
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class Filter(BaseModel):
+    """A ``column op value`` predicate pushed down into table scans."""
+
+    column: str
+    op: str
+    value: Optional[Any] = None
+
+    @field_validator("op")
+    @classmethod
+    def validate_op(cls, op: str) -> str:
+        op = " ".join(op.lower().split())
+        if op == "==":
+            op = "="
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported filter operator '{op}'")
+        return op
+
+    @classmethod
+    def init(cls, data: "Filter | tuple | list | dict") -> "Filter":
+        if isinstance(data, Filter):
+            return data
+        if isinstance(data, dict):
+            return cls(**data)
+        return cls(**dict(zip(("column", "op", "value"), data)))
+
+    def to_list(self) -> list:
+        if self.op in ("is null", "is not null"):
+            return [self.column, self.op]
+        return [self.column, self.op, self.value]
+
+    def to_sql(self) -> tuple[str, list]:
+        """SQL condition with ``?`` placeholders and the values to bind."""
+        column = quote_identifier(self.column)
+        if self.op in ("is null", "is not null"):
+            return f"{column} {self.op}", []
+        if self.op in ("in", "not in"):
+            values = list(self.value)
+            if not values:
+                return ("false" if self.op == "in" else "true"), []
+            placeholders = ", ".join("?" for _ in values)
+            return f"{column} {self.op} ({placeholders})", values
+        return f"{column} {self.op} ?", [self.value]
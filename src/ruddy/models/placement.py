@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+
+class Placement(BaseModel):
+    """Where the shards of a table live.
+
+    Rows go to ``nodes[hash(shard_key) % len(nodes)]``, the node list is
+    fixed when the table is placed so nodes added later don't move rows.
+    """
+
+    path: list[str]
+    nodes: list[str]
+    shard_key: str
+
+    @property
+    def key(self) -> tuple[str, ...]:
+        return tuple(p.lower() for p in self.path)
@@ -0,0 +1,33 @@
+import json
+
+import pyarrow as pa
+from pydantic import BaseModel
+
+# app metadata a client attaches to a batch to have the server commit it now
+FLUSH = b"flush"
+
+
+def requests_flush(app_metadata: pa.Buffer | None) -> bool:
+    return app_metadata is not None and app_metadata.to_pybytes() == FLUSH
+
+
+class PutProgress(BaseModel):
+    """Cumulative amount of data committed by the server during a do_put."""
+
+    rows: int = 0
+    nbytes: int = 0
+
+    def serialize(self) -> bytes:
+        return json.dumps({"rows": self.rows, "nbytes": self.nbytes}).encode("utf-8")
+
+    @classmethod
+    def deserialize(cls, data: str | bytes | pa.Buffer) -> "PutProgress":
+        if isinstance(data, pa.Buffer):
+            data = data.to_pybytes()
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        return cls(**json.loads(data))
+
+    @property
+    def buffer(self) -> pa.Buffer:
+        return pa.py_buffer(self.serialize())
@@ -6,6 +6,7 @@ import pyarrow.flight as flight
 from pydantic import BaseModel
 
 from ruddy.constants import DUCKDB_DEFAULT_DATABASE, DUCKDB_DEFAULT_SCHEMA
+from ruddy.models.filter import quote_identifier
 
 
 class Base(BaseModel, extra="ignore"):
@@ -79,6 +80,13 @@ class Table(Base):
             items = [self.catalog_name, self.schema_name] + items
         return ".".join(items)
 
+    @property
+    def quoted_name(self):
+        items = [self.name]
+        if self.catalog_name and self.schema_name:
+            items = [self.catalog_name, self.schema_name] + items
+        return ".".join(quote_identifier(item) for item in items)
+
     def database_or_default(self, default: str = DUCKDB_DEFAULT_DATABASE) -> str:
         return self.database or default
 
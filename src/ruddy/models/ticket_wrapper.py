@@ -1,11 +1,17 @@
+import base64
 import json
 import logging
+import struct
 from typing import Any, Optional
 
+import pyarrow as pa
 import pyarrow.flight as flight
 from pydantic import BaseModel
 
+from ruddy.models.filter import Filter
 from ruddy.models.table import Table
+from ruddy.settings import settings
+from ruddy.utils.models import construct
 
 logger = logging.getLogger(__name__)
 
@@ -13,53 +19,276 @@ logger = logging.getLogger(__name__)
 class DataType:
     COMMAND: str = "command"
     TABLE: str = "table"
+    PREPARED: str = "prepared"
+    JOB: str = "job"
+    SUBSCRIPTION: str = "subscription"
+
+
+class Compact:
+    """Layout of the binary ticket encoding.
+
+    header: magic, version, kind, flags
+    command: u32 length prefixed utf-8 query
+    table, subscription: database, catalog_name, schema, name as u32 length
+    prefixed strings
+    prepared: u32 length prefixed statement handle
+    job: u32 length prefixed job id
+    optional, in flag order: partition (i64 start, i64 end or -1), columns
+    (u32 count + strings), filters (json string), limit (i64), parameters
+    (u32 length prefixed arrow ipc stream), since (watermark string)
+    """
+
+    MAGIC = b"RT"
+    VERSION = 1
+    HEADER = struct.Struct("<2sBBB")
+    U32 = struct.Struct("<I")
+    I64 = struct.Struct("<q")
+    PARTITION = struct.Struct("<qq")
+    NULL = 0xFFFFFFFF
+
+    KIND_COMMAND = 0
+    KIND_TABLE = 1
+    KIND_PREPARED = 2
+    KIND_JOB = 3
+    KIND_SUBSCRIPTION = 4
+
+    HAS_PARTITION = 1
+    HAS_COLUMNS = 2
+    HAS_FILTERS = 4
+    HAS_LIMIT = 8
+    HAS_PARAMETERS = 16
+    HAS_SINCE = 32
+
+
+def pack_str(value: str | None) -> bytes:
+    if value is None:
+        return Compact.U32.pack(Compact.NULL)
+    data = value.encode("utf-8")
+    return Compact.U32.pack(len(data)) + data
+
+
+def unpack_str(buf: bytes, offset: int) -> tuple[str | None, int]:
+    data, offset = unpack_bytes(buf, offset)
+    return None if data is None else data.decode("utf-8"), offset
+
+
+def pack_bytes(data: bytes) -> bytes:
+    return Compact.U32.pack(len(data)) + data
+
+
+def unpack_bytes(buf: bytes, offset: int) -> tuple[bytes | None, int]:
+    (size,) = Compact.U32.unpack_from(buf, offset)
+    offset += 4
+    if size == Compact.NULL:
+        return None, offset
+    return buf[offset : offset + size], offset + size
+
+
+# half open rowid range [start, end), an end of None reads to the end of the table
+Partition = tuple[int, Optional[int]]
 
 
 class TicketWrapper(BaseModel, arbitrary_types_allowed=True):
     data_type: Optional[str] = DataType.TABLE
     data: Table | str
+    partition: Optional[Partition] = None
+    # pushed down into table scans
+    columns: Optional[list[str]] = None
+    filters: Optional[list[Filter]] = None
+    limit: Optional[int] = None
+    # arrow ipc stream with one row per execution of a prepared statement
+    parameters: Optional[bytes] = None
+    # watermark, a table ticket then only reads the rows appended after it
+    since: Optional[str] = None
 
     def model_post_init(self, __context: Any) -> None:
         return super().model_post_init(__context)
 
-    def serialize(self) -> bytes:
+    def serialize(self, compact: bool = None) -> bytes:
+        if compact is None:
+            compact = settings.COMPACT_TICKETS
+        if compact:
+            return self.to_compact()
+
         if isinstance(self.data, Table):
             data = self.data.to_dict()
         else:
             data = self.data
-        return json.dumps(
-            {
-                "data_type": self.data_type,
-                "data": data,
-            }
-        ).encode("utf-8")
+        payload = {
+            "data_type": self.data_type,
+            "data": data,
+        }
+        if self.partition is not None:
+            payload["partition"] = self.partition
+        if self.columns is not None:
+            payload["columns"] = self.columns
+        if self.filters is not None:
+            payload["filters"] = [f.to_list() for f in self.filters]
+        if self.limit is not None:
+            payload["limit"] = self.limit
+        if self.parameters is not None:
+            payload["parameters"] = base64.b64encode(self.parameters).decode("ascii")
+        if self.since is not None:
+            payload["since"] = self.since
+        return json.dumps(payload).encode("utf-8")
+
+    def to_compact(self) -> bytes:
+        flags = 0
+        parts = []
+        if isinstance(self.data, Table):
+            if self.data_type == DataType.SUBSCRIPTION:
+                kind = Compact.KIND_SUBSCRIPTION
+            else:
+                kind = Compact.KIND_TABLE
+            table = self.data.to_dict()
+            for key in ("database", "catalog_name", "schema", "name"):
+                parts.append(pack_str(table[key]))
+        elif self.data_type == DataType.PREPARED:
+            kind = Compact.KIND_PREPARED
+            parts.append(pack_str(self.data))
+        elif self.data_type == DataType.JOB:
+            kind = Compact.KIND_JOB
+            parts.append(pack_str(self.data))
+        else:
+            kind = Compact.KIND_COMMAND
+            parts.append(pack_str(self.data))
+
+        if self.partition is not None:
+            flags |= Compact.HAS_PARTITION
+            start, end = self.partition
+            parts.append(Compact.PARTITION.pack(start, -1 if end is None else end))
+        if self.columns is not None:
+            flags |= Compact.HAS_COLUMNS
+            parts.append(Compact.U32.pack(len(self.columns)))
+            parts.extend(pack_str(c) for c in self.columns)
+        if self.filters is not None:
+            flags |= Compact.HAS_FILTERS
+            parts.append(pack_str(json.dumps([f.to_list() for f in self.filters])))
+        if self.limit is not None:
+            flags |= Compact.HAS_LIMIT
+            parts.append(Compact.I64.pack(self.limit))
+        if self.parameters is not None:
+            flags |= Compact.HAS_PARAMETERS
+            parts.append(pack_bytes(self.parameters))
+        if self.since is not None:
+            flags |= Compact.HAS_SINCE
+            parts.append(pack_str(self.since))
+
+        header = Compact.HEADER.pack(Compact.MAGIC, Compact.VERSION, kind, flags)
+        return header + b"".join(parts)
+
+    @classmethod
+    def from_compact(cls, buf: bytes) -> "TicketWrapper":
+        """Decode a binary ticket without running pydantic validation."""
+        _, version, kind, flags = Compact.HEADER.unpack_from(buf, 0)
+        if version != Compact.VERSION:
+            raise ValueError(f"Unsupported ticket version {version}")
+        offset = Compact.HEADER.size
+
+        if kind in (Compact.KIND_TABLE, Compact.KIND_SUBSCRIPTION):
+            database, offset = unpack_str(buf, offset)
+            catalog_name, offset = unpack_str(buf, offset)
+            schema, offset = unpack_str(buf, offset)
+            name, offset = unpack_str(buf, offset)
+            if kind == Compact.KIND_SUBSCRIPTION:
+                data_type = DataType.SUBSCRIPTION
+            else:
+                data_type = DataType.TABLE
+            data = construct(
+                Table,
+                name=name,
+                database=database,
+                catalog_name=catalog_name,
+                schema_name=schema,
+            )
+        elif kind == Compact.KIND_COMMAND:
+            data_type = DataType.COMMAND
+            data, offset = unpack_str(buf, offset)
+        elif kind == Compact.KIND_PREPARED:
+            data_type = DataType.PREPARED
+            data, offset = unpack_str(buf, offset)
+        elif kind == Compact.KIND_JOB:
+            data_type = DataType.JOB
+            data, offset = unpack_str(buf, offset)
+        else:
+            raise ValueError("Invalid data type")
+
+        partition, columns, filters, limit, parameters = None, None, None, None, None
+        since = None
+        if flags & Compact.HAS_PARTITION:
+            start, end = Compact.PARTITION.unpack_from(buf, offset)
+            offset += Compact.PARTITION.size
+            partition = (start, None if end == -1 else end)
+        if flags & Compact.HAS_COLUMNS:
+            (count,) = Compact.U32.unpack_from(buf, offset)
+            offset += 4
+            columns = []
+            for _ in range(count):
+                column, offset = unpack_str(buf, offset)
+                columns.append(column)
+        if flags & Compact.HAS_FILTERS:
+            # operators are validated, they end up in generated sql
+            encoded, offset = unpack_str(buf, offset)
+            filters = [Filter.init(f) for f in json.loads(encoded)]
+        if flags & Compact.HAS_LIMIT:
+            (limit,) = Compact.I64.unpack_from(buf, offset)
+            offset += Compact.I64.size
+        if flags & Compact.HAS_PARAMETERS:
+            parameters, offset = unpack_bytes(buf, offset)
+        if flags & Compact.HAS_SINCE:
+            since, offset = unpack_str(buf, offset)
+
+        return construct(
+            cls,
+            data_type=data_type,
+            data=data,
+            partition=partition,
+            columns=columns,
+            filters=filters,
+            limit=limit,
+            parameters=parameters,
+            since=since,
+        )
 
     @classmethod
     def deserialize(cls, ticket: str | bytes) -> "TicketWrapper":
         if isinstance(ticket, bytes):
+            if ticket[:2] == Compact.MAGIC:
+                return cls.from_compact(ticket)
             ticket = ticket.decode("utf-8")
         payload = json.loads(ticket)
         data_type = payload["data_type"]
-        if data_type == DataType.COMMAND:
+        if data_type in (DataType.COMMAND, DataType.PREPARED, DataType.JOB):
             data = payload["data"]
-        elif data_type == DataType.TABLE:
+        elif data_type in (DataType.TABLE, DataType.SUBSCRIPTION):
             data = Table.from_dict(payload["data"])
         else:
             raise ValueError("Invalid data type")
 
-        return cls(data_type=data_type, data=data)
+        filters = payload.get("filters")
+        parameters = payload.get("parameters")
+        return cls(
+            data_type=data_type,
+            data=data,
+            partition=payload.get("partition"),
+            columns=payload.get("columns"),
+            filters=None if filters is None else [Filter.init(f) for f in filters],
+            limit=payload.get("limit"),
+            parameters=None if parameters is None else base64.b64decode(parameters),
+            since=payload.get("since"),
+        )
 
     @property
     def ticket(self) -> flight.Ticket:
         return flight.Ticket(self.serialize())
 
     @classmethod
-    def from_table(cls, table: Table) -> "TicketWrapper":
-        return cls(data_type=DataType.TABLE, data=table)
+    def from_table(cls, table: Table, partition: Partition = None) -> "TicketWrapper":
+        return cls(data_type=DataType.TABLE, data=table, partition=partition)
 
     @classmethod
-    def ticket_from_table(cls, table: Table) -> flight.Ticket:
-        return cls.from_table(table).ticket
+    def ticket_from_table(cls, table: Table, partition: Partition = None) -> flight.Ticket:
+        return cls.from_table(table, partition).ticket
 
     @classmethod
     def from_command(cls, command: str | bytes) -> "TicketWrapper":
@@ -70,3 +299,29 @@ class TicketWrapper(BaseModel, arbitrary_types_allowed=True):
     @classmethod
     def ticket_from_command(cls, command: str | bytes) -> flight.Ticket:
         return cls.from_command(command).ticket
+
+    @classmethod
+    def from_prepared(
+        cls, handle: str, parameters: pa.Table | pa.RecordBatch = None
+    ) -> "TicketWrapper":
+        data = None
+        if parameters is not None:
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, parameters.schema) as writer:
+                writer.write(parameters)
+            data = sink.getvalue().to_pybytes()
+        return cls(data_type=DataType.PREPARED, data=handle, parameters=data)
+
+    @classmethod
+    def from_job(cls, job_id: str) -> "TicketWrapper":
+        return cls(data_type=DataType.JOB, data=job_id)
+
+    @classmethod
+    def from_subscription(cls, table: Table) -> "TicketWrapper":
+        return cls(data_type=DataType.SUBSCRIPTION, data=table)
+
+    @property
+    def parameters_table(self) -> pa.Table | None:
+        if self.parameters is None:
+            return None
+        return pa.ipc.open_stream(self.parameters).read_all()
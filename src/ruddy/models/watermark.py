@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+
+
+class Watermark(BaseModel):
+    """Position in a table's append history.
+
+    ``rows`` bounds the rowids appended so far, rows at or past it were added
+    later. It is only comparable while ``lineage`` is unchanged, any write
+    other than an append starts a new lineage.
+    """
+
+    lineage: str
+    rows: int
+
+    def serialize(self) -> str:
+        return f"{self.lineage}/{self.rows}"
+
+    @classmethod
+    def deserialize(cls, watermark: str) -> "Watermark":
+        lineage, _, rows = watermark.rpartition("/")
+        if not lineage:
+            raise ValueError(f"Invalid watermark {watermark}")
+        return cls(lineage=lineage, rows=int(rows))
+
+    def follows(self, other: "Watermark | None") -> bool:
+        """True if the rows since ``other`` can be read as a delta."""
+        return (
+            other is not None
+            and other.lineage == self.lineage
+            and other.rows <= self.rows
+        )
@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+import pyarrow.flight as flight
+
+logger = logging.getLogger(__name__)
+
+CatalogKey = tuple[str, str, str]
+
+
+def catalog_key(descriptor: flight.FlightDescriptor) -> CatalogKey:
+    return tuple(
+        p.decode("utf-8") if isinstance(p, bytes) else p for p in descriptor.path
+    )
+
+
+class CatalogCache:
+    """Ready built ``FlightInfo`` objects keyed by (catalog, schema, table).
+
+    The whole catalog is loaded on first use and again once ``ttl`` seconds
+    have passed. Invalidated tables and tables missing from the cache are
+    reloaded one by one, so a write never forces a full catalog scan.
+    """
+
+    def __init__(
+        self,
+        # loads the tables of a key, a key prefix or, given None, all of them
+        loader: Callable[[Optional[tuple]], Iterable[flight.FlightInfo]],
+        ttl: float = None,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.infos: dict[CatalogKey, flight.FlightInfo] = {}
+        self.stale: set[CatalogKey] = set()
+        # databases attached since the last load, their tables aren't known yet
+        self.added: set[str] = set()
+        self.loaded_at: float = None
+
+    def expired(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self.loaded_at > self.ttl
+
+    def reload(self):
+        logger.debug("Loading catalog")
+        infos = {catalog_key(info.descriptor): info for info in self.loader(None)}
+        self.infos = infos
+        self.stale = set()
+        self.added = set()
+        self.loaded_at = time.monotonic()
+
+    def refresh(self, key: CatalogKey):
+        logger.debug(f"Refreshing catalog entry {key}")
+        self.stale.discard(key)
+        for info in self.loader(key):
+            self.infos[key] = info
+            break
+        else:
+            self.infos.pop(key, None)
+
+    def load_catalog(self, catalog_name: str):
+        logger.debug(f"Loading catalog {catalog_name}")
+        self.added.discard(catalog_name)
+        for info in self.loader((catalog_name,)):
+            self.infos[catalog_key(info.descriptor)] = info
+
+    def list(self, catalog_name: str = None) -> list[flight.FlightInfo]:
+        """Every table, or the tables of ``catalog_name`` only."""
+        with self.lock:
+            if self.expired():
+                self.reload()
+            for name in list(self.added):
+                self.load_catalog(name)
+            for key in list(self.stale):
+                self.refresh(key)
+            return [
+                info
+                for key, info in self.infos.items()
+                if catalog_name is None or key[0] == catalog_name
+            ]
+
+    def get(self, key: CatalogKey) -> flight.FlightInfo | None:
+        with self.lock:
+            if self.expired():
+                self.reload()
+            if key in self.stale or key not in self.infos:
+                self.refresh(key)
+            return self.infos.get(key)
+
+    def add_catalog(self, catalog_name: str):
+        """Have the tables of an attached database loaded on the next list."""
+        with self.lock:
+            self.added.add(catalog_name)
+
+    def drop_catalog(self, catalog_name: str):
+        """Forget the tables of a detached database."""
+        with self.lock:
+            for key in [k for k in self.infos if k[0] == catalog_name]:
+                del self.infos[key]
+            self.stale = {k for k in self.stale if k[0] != catalog_name}
+            self.added.discard(catalog_name)
+
+    def invalidate(self, key: CatalogKey = None):
+        with self.lock:
+            if key is None:
+                self.loaded_at = None
+            else:
+                self.stale.add(key)
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import duckdb
+
+from ruddy.constants import DUCKDB_DEFAULT_DATABASE
+from ruddy.models.filter import quote_identifier
+from ruddy.models.table import Table
+from ruddy.server.backend.files import check_path
+from ruddy.server.backend.prepared import sql_literal
+
+logger = logging.getLogger(__name__)
+
+
+class Attached:
+    def __init__(self, alias: str, path: str):
+        self.alias = alias
+        self.path = path
+        self.leases = 0
+        self.last_used = time.monotonic()
+
+
+class Databases:
+    """DuckDB files ATTACHed to the server's connection on first use.
+
+    Requests name a database by file name, or path, under ``root`` and are
+    routed to the catalog it is attached as, without a root only the primary
+    database is served. The catalog name
+    is the one ``Table`` derives from the path, so table tickets address it
+    directly. Databases in use by a request hold a lease. Once more than
+    ``max_attached`` are attached, or one has been unused for
+    ``idle_timeout`` seconds, the least recently used one without a lease is
+    detached.
+    """
+
+    def __init__(
+        self,
+        primary: str,
+        root: str = None,
+        max_attached: int = 64,
+        idle_timeout: float = None,
+        on_attach: Callable[[str], None] = None,
+        on_detach: Callable[[str], None] = None,
+    ):
+        self.primary = primary
+        self.primary_alias = Table(name="", database=primary).catalog_name
+        self.root = root
+        self.max_attached = max_attached
+        self.idle_timeout = idle_timeout
+        self.on_attach = on_attach
+        self.on_detach = on_detach
+        self.lock = threading.Lock()
+        self.attached: OrderedDict[str, Attached] = OrderedDict()
+        self.attaches = 0
+        self.detaches = 0
+
+    def path(self, database: str) -> str | None:
+        """Normalized path of ``database``, None for the primary database."""
+        if not database or database in (DUCKDB_DEFAULT_DATABASE, self.primary):
+            return None
+        if self.root is None:
+            raise PermissionError(
+                f"Can't attach {database}, DATABASE_ROOT isn't configured"
+            )
+        if not os.path.isabs(database) and not database.endswith(".duckdb"):
+            database = f"{database}.duckdb"
+        return check_path(os.path.join(self.root, database), self.root)
+
+    def alias(self, database: str) -> str:
+        """Catalog name ``database`` is, or would be, attached as."""
+        path = self.path(database)
+        if path is None:
+            return self.primary_alias
+        return Table(name="", database=path).catalog_name
+
+    def database(self, alias: str) -> str:
+        """Path of the database attached as ``alias``."""
+        with self.lock:
+            attached = self.attached.get(alias)
+        return self.primary if attached is None else attached.path
+
+    def lease(self, conn: duckdb.DuckDBPyConnection, database: str) -> str:
+        """Catalog of ``database``, attached if needed, held until ``release``."""
+        path = self.path(database)
+        if path is None:
+            return self.primary_alias
+        alias = Table(name="", database=path).catalog_name
+
+        with self.lock:
+            attached = self.attached.get(alias)
+            if attached is not None and attached.path != path:
+                raise ValueError(
+                    f"{path} clashes with {attached.path}, both attach as {alias}"
+                )
+            if attached is None:
+                # the primary, system or catalogs attached by statements
+                catalogs = conn.execute(
+                    "SELECT database_name FROM duckdb_databases()"
+                ).fetchall()
+                if alias in {catalog for (catalog,) in catalogs}:
+                    raise ValueError(
+                        f"{path} would attach as {alias}, a catalog that is in use"
+                    )
+                name = quote_identifier(alias)
+                query = f"ATTACH IF NOT EXISTS {sql_literal(path)} AS {name}"
+                logger.debug(query)
+                conn.execute(query)
+                attached = self.attached[alias] = Attached(alias, path)
+                self.attaches += 1
+                logger.info(f"Attached {path} as {alias}")
+                if self.on_attach is not None:
+                    self.on_attach(alias)
+            self.attached.move_to_end(alias)
+            attached.leases += 1
+            attached.last_used = time.monotonic()
+            self.evict(conn)
+        return alias
+
+    def release(self, alias: str):
+        with self.lock:
+            if (attached := self.attached.get(alias)) is not None:
+                attached.leases -= 1
+                attached.last_used = time.monotonic()
+
+    def evict(self, conn: duckdb.DuckDBPyConnection):
+        now = time.monotonic()
+        over = len(self.attached) - self.max_attached
+        for attached in list(self.attached.values()):
+            if attached.leases:
+                continue
+            idle = (
+                self.idle_timeout is not None
+                and now - attached.last_used >= self.idle_timeout
+            )
+            if over <= 0 and not idle:
+                continue
+            name = quote_identifier(attached.alias)
+            try:
+                conn.execute(f"DETACH DATABASE IF EXISTS {name}")
+            except duckdb.Error as e:
+                # dropped anyway, a stuck entry would fail every later eviction
+                logger.warning(f"Failed to detach {attached.path}: {e}")
+            del self.attached[attached.alias]
+            over -= 1
+            self.detaches += 1
+            logger.info(f"Detached {attached.path}")
+            if self.on_detach is not None:
+                self.on_detach(attached.alias)
+
+    def close_idle(self, conn: duckdb.DuckDBPyConnection):
+        with self.lock:
+            self.evict(conn)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "attached": len(self.attached),
+                "leased": sum(1 for a in self.attached.values() if a.leases),
+                "max_attached": self.max_attached,
+                "attaches": self.attaches,
+                "detaches": self.detaches,
+            }
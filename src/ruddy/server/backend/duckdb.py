@@ -1,79 +1,218 @@
 import logging
-from typing import Any, Generator
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Generator
 
 import duckdb
 import pyarrow as pa
+import pyarrow.dataset as ds
 import pyarrow.flight as flight
-import pydash as _
 
 from ruddy.constants import DUCKDB_DEFAULT_DATABASE, DUCKDB_DEFAULT_SCHEMA
 from ruddy.models.endpoint_wrapper import EndpointWrapper
+from ruddy.models.file_transfer import ExportQuery, ImportFiles
+from ruddy.models.filter import quote_identifier
 from ruddy.models.table import Table
-from ruddy.models.ticket_wrapper import TicketWrapper
+from ruddy.models.ticket_wrapper import DataType, Partition, TicketWrapper
+from ruddy.models.watermark import Watermark
+from ruddy.server.backend import files
+from ruddy.server.backend.catalog import CatalogCache, CatalogKey
+from ruddy.server.backend.databases import Databases
+from ruddy.server.backend.pool import CursorPool
+from ruddy.server.backend.prepared import PreparedStatements
+from ruddy.server.backend.result_cache import ResultCache
+from ruddy.server.backend.snapshots import ROWID, SnapshotStore, scan, table_key
+from ruddy.server.backend.types import ArrowTypes
+from ruddy.server.backend.versions import Versions, mentioned_names
+from ruddy.server.middleware.metrics_middleware import CallMetrics
+from ruddy.settings import settings
+from ruddy.utils import ipc
+from ruddy.utils.lru import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# relation the stream uploaded to do_exchange is registered as
+EXCHANGE_INPUT = "input"
+
 
 class Duckdb:
     def __init__(self, config: dict = None):
         self.config = {
             "database": DUCKDB_DEFAULT_DATABASE,
             "schema": DUCKDB_DEFAULT_SCHEMA,
+            "streaming": settings.STREAMING,
+            "batch_size": settings.BATCH_SIZE,
+            "pool_size": settings.POOL_SIZE,
+            "pool_max_waiting": settings.POOL_MAX_WAITING,
+            "pool_timeout": settings.POOL_TIMEOUT,
+            "catalog_ttl": settings.CATALOG_TTL,
+            "schema_cache_size": settings.SCHEMA_CACHE_SIZE,
+            "result_cache_bytes": settings.RESULT_CACHE_BYTES,
+            "result_cache_entry_bytes": settings.RESULT_CACHE_ENTRY_BYTES,
+            "compression": settings.COMPRESSION,
+            "compression_level": settings.COMPRESSION_LEVEL,
+            "prepared_statements": settings.PREPARED_STATEMENTS,
+            "partition_rows": settings.PARTITION_ROWS,
+            "max_partitions": settings.MAX_PARTITIONS,
+            "file_root": settings.FILE_ROOT,
+            "snapshot_dir": settings.SNAPSHOT_DIR,
+            "snapshot_tables": settings.SNAPSHOT_TABLES,
+            "database_root": settings.DATABASE_ROOT,
+            "max_attached_databases": settings.MAX_ATTACHED_DATABASES,
+            "database_idle_seconds": settings.DATABASE_IDLE_SECONDS,
             **(config or {}),
         }
-        if not config.get("location"):
+        if not self.config.get("location"):
             raise ValueError("'location' must be specified in config: dict")
 
         self.conn: duckdb.DuckDBPyConnection = None
+        # attaches and detaches databases, only used under the Databases lock
+        self.admin: duckdb.DuckDBPyConnection = None
+        self.pool: CursorPool = None
+        # (catalog, schema) each pool cursor last switched to, and its lease
+        self.routes: dict[int, tuple[str, str]] = {}
+        self.leases: dict[int, str] = {}
+        # detaches update routes under the Databases lock, this one nests in it
+        self.routing = threading.Lock()
+        self.closed = threading.Event()
+        self.catalog = CatalogCache(self.load_catalog, ttl=self.config["catalog_ttl"])
+        self.databases = Databases(
+            self.config["database"],
+            root=self.config["database_root"],
+            max_attached=self.config["max_attached_databases"],
+            idle_timeout=self.config["database_idle_seconds"],
+            on_attach=self.attached,
+            on_detach=self.detached,
+        )
+        self.schemas = LRUCache(self.config["schema_cache_size"])
+        self.arrow_types = ArrowTypes(self.config["schema_cache_size"])
+        self.prepared = PreparedStatements(self.config["prepared_statements"])
+        self.results = ResultCache(
+            self.config["result_cache_bytes"], self.config["result_cache_entry_bytes"]
+        )
+        self.snapshots = SnapshotStore(
+            self.config["snapshot_dir"], self.config["snapshot_tables"]
+        )
+        self.versions = Versions()
 
     def connect(self) -> "Duckdb":
         self.conn = duckdb.connect(database=self.config.get("database"))
+        self.admin = self.conn.cursor()
+        self.pool = CursorPool(
+            self.new_cursor,
+            max_size=self.config["pool_size"],
+            max_waiting=self.config["pool_max_waiting"],
+            timeout=self.config["pool_timeout"],
+        )
+        if self.config["database_idle_seconds"]:
+            threading.Thread(
+                target=self.close_idle_databases, name="ruddy-detach", daemon=True
+            ).start()
+        return self
+
+    def new_cursor(self) -> duckdb.DuckDBPyConnection:
+        # cursors don't inherit connection settings like the schema
+        cursor = self.conn.cursor()
         if schema := self.config.get("schema"):
-            self.conn.execute(f"SET schema = '{schema}'")
+            cursor.execute(f"SET schema = '{schema}'")
+        return cursor
 
-        return self
+    def close(self):
+        self.closed.set()
+        if self.pool is not None:
+            self.pool.close()
+
+    def close_idle_databases(self):
+        interval = self.config["database_idle_seconds"] / 2
+        while not self.closed.wait(interval):
+            try:
+                self.databases.close_idle(self.admin)
+            except duckdb.Error as e:
+                logger.warning(f"Failed to detach idle databases: {e}")
+
+    def attached(self, alias: str):
+        self.catalog.add_catalog(alias)
+
+    def detached(self, alias: str):
+        self.catalog.drop_catalog(alias)
+        # cursors that were using it must switch again
+        with self.routing:
+            for key, route in list(self.routes.items()):
+                if route[0] == alias:
+                    del self.routes[key]
+
+    def acquire(
+        self, database: str = None, schema: str = None
+    ) -> duckdb.DuckDBPyConnection:
+        """Pool cursor on ``database`` and ``schema``, the configured ones by default.
+
+        The database is attached if needed and can't be detached until the
+        cursor is given back with ``release``.
+        """
+        cursor = self.pool.acquire()
+        try:
+            alias = self.databases.lease(self.admin, database)
+        except Exception:
+            self.pool.release(cursor)
+            raise
+        try:
+            route = (alias, schema or self.config["schema"])
+            with self.routing:
+                current = self.routes.get(id(cursor))
+            if current != route:
+                names = ".".join(quote_identifier(name) for name in route)
+                cursor.execute(f"USE {names}")
+                with self.routing:
+                    self.routes[id(cursor)] = route
+        except Exception:
+            self.databases.release(alias)
+            self.pool.release(cursor)
+            raise
+        with self.routing:
+            self.leases[id(cursor)] = alias
+        return cursor
+
+    def release(self, cursor: duckdb.DuckDBPyConnection):
+        with self.routing:
+            alias = self.leases.pop(id(cursor))
+        self.databases.release(alias)
+        self.pool.release(cursor)
+
+    @contextmanager
+    def cursor(
+        self, database: str = None, schema: str = None
+    ) -> Generator[duckdb.DuckDBPyConnection, None, None]:
+        cursor = self.acquire(database, schema)
+        try:
+            yield cursor
+        finally:
+            self.release(cursor)
 
     @property
     def location(self):
         return self.config.get("location")
 
-    @classmethod
-    def arrow_type_map(cls) -> Any:
-        return {
-            "BOOLEAN": pa.bool_(),
-            "TINYINT": pa.int8(),
-            "SMALLINT": pa.int16(),
-            "INTEGER": pa.int32(),
-            "BIGINT": pa.int64(),
-            "UTINYINT": pa.uint8(),
-            "USMALLINT": pa.uint16(),
-            "UINTEGER": pa.uint32(),
-            "UBIGINT": pa.uint64(),
-            "FLOAT": pa.float32(),
-            "DOUBLE": pa.float64(),
-            "DECIMAL": pa.decimal128(38, 18),
-            "DATE": pa.date32(),
-            "TIME": pa.time32("s"),
-            "TIMESTAMP": pa.timestamp("ns"),
-            "VARCHAR": pa.string(),
-            "BLOB": pa.binary(),
-        }
-
-    def to_pyarrow_type(self, type_name: str) -> Any:
-        return self.arrow_type_map().get(type_name.upper(), pa.string())
-
-    def flights(
-        self, options: dict, filters: dict = None
-    ) -> Generator[flight.FlightInfo, None, None]:
+    def flights(self, filters: dict = None) -> Generator[flight.FlightInfo, None, None]:
         query = """
             select
                 rank_dense() over (order by table_catalog, table_schema, table_name) table_id,
-                table_catalog, table_schema, table_name, column_name, data_type
-            from information_schema.columns"""
+                table_catalog, table_schema, table_name, column_name, data_type,
+                t.estimated_size
+            from information_schema.columns c
+            left join (
+                select database_name, schema_name, table_name as name, estimated_size
+                from duckdb_tables()
+            ) t
+                on t.database_name = c.table_catalog
+                and t.schema_name = c.table_schema
+                and t.name = c.table_name"""
+        params = []
         if filters:
-            condition = (
-                _.chain(filters).map(lambda v, k: f"{k}='{v}'").join(" and\n").value()
-            )
+            # names are fixed columns, the values come from descriptor paths
+            condition = " and\n".join(f"{k} = ?" for k in filters)
+            params = list(filters.values())
             query = f"""{query}
             where
                 {condition}
@@ -83,10 +222,13 @@ class Duckdb:
         )
         logger.debug(query)
         id = None
-        descriptor, endpoint = None, None
+        descriptor, endpoints = None, None
         columns: list = []
+        total_records = -1
 
-        result = self.conn.query(query).fetchall()
+        with self.cursor() as cursor:
+            result = cursor.execute(query, params).fetchall()
+            types = self.arrow_types.resolve(cursor, (row[5] for row in result))
         for (
             table_id,
             table_catalog,
@@ -94,48 +236,72 @@ class Duckdb:
             table_name,
             column_name,
             data_type,
+            estimated_size,
         ) in result:
             if id is None:
                 id = table_id
             elif id != table_id:
                 yield flight.FlightInfo(
-                    pa.schema(columns), descriptor, [endpoint.flight_endpoint], -1, -1
+                    pa.schema(columns), descriptor, endpoints, total_records, -1
                 )
-                descriptor, endpoint = None, None
+                descriptor, endpoints = None, None
+                columns = []
                 id = table_id
 
             if descriptor is None:
                 descriptor = flight.FlightDescriptor.for_path(
                     table_catalog, table_schema, table_name
                 )
-                endpoint = EndpointWrapper.from_table(
-                    Table(
-                        name=table_name,
-                        database=options.get("database"),
-                        catalog_name=table_catalog,
-                        schema_name=table_schema,
-                    ),
-                    [self.config.get("location")],
+                total_records = -1 if estimated_size is None else estimated_size
+                table = Table(
+                    name=table_name,
+                    database=self.databases.database(table_catalog),
+                    catalog_name=table_catalog,
+                    schema_name=table_schema,
                 )
+                endpoints = [
+                    EndpointWrapper.from_table(
+                        table, [self.config.get("location")], partition
+                    ).flight_endpoint
+                    for partition in self.partitions(total_records)
+                ]
 
-            columns.append(
-                (
-                    column_name,
-                    self.to_pyarrow_type(data_type),
-                ),
-            )
+            columns.append(types[data_type].with_name(column_name))
 
         if descriptor:
             yield flight.FlightInfo(
-                pa.schema(columns), descriptor, [endpoint.flight_endpoint], -1, -1
+                pa.schema(columns), descriptor, endpoints, total_records, -1
             )
-        else:
-            raise RuntimeError("Could not find any dataset")
 
-    def list_flights(
-        self, options: dict = None
+    def partitions(self, total_records: int) -> list[Partition | None]:
+        """Split a table of ``total_records`` rows into rowid ranges.
+
+        The last range is open ended so rows past the estimate are not lost.
+        """
+        rows = self.config["partition_rows"]
+        count = min(self.config["max_partitions"], math.ceil(total_records / rows))
+        if count <= 1:
+            return [None]
+        step = math.ceil(total_records / count)
+        return [
+            (i * step, (i + 1) * step if i < count - 1 else None) for i in range(count)
+        ]
+
+    def load_catalog(
+        self, key: CatalogKey = None
     ) -> Generator[flight.FlightInfo, None, None]:
-        yield self.flights(options)
+        filters = None
+        if key:
+            filters = dict(zip(("table_catalog", "table_schema", "table_name"), key))
+        return self.flights(filters)
+
+    def list_flights(self, options: dict = None) -> list[flight.FlightInfo]:
+        """Tables of the database the request is routed to."""
+        database = (options or {}).get("database")
+        # attaches the database before its tables are listed
+        with self.cursor(database):
+            catalog_name = self.databases.alias(database)
+        return self.catalog.list(catalog_name)
 
     def get_flight_info(self, options: dict, descriptor):
         if descriptor.descriptor_type == flight.DescriptorType.PATH:
@@ -143,43 +309,434 @@ class Duckdb:
                 [options.get("database"), options.get("schema")]
                 + list(descriptor.path),
             )
-            filters = {
-                "table_catalog": table.catalog_name,
-                "table_schema": table.schema_or_default(),
-                "table_name": table.name,
-            }
-            for info in self.flights(options, filters):
-                return info
-            else:
+            # attaches the database before its tables are looked up
+            with self.cursor(table.database):
+                table.catalog_name = self.databases.alias(table.database)
+            info = self.catalog.get(
+                (table.catalog_name, table.schema_or_default(), table.name)
+            )
+            if info is None:
                 raise ValueError("Couldn't find any dataset")
+            # cached infos are shared, the version goes on a copy
+            return flight.FlightInfo(
+                info.schema,
+                info.descriptor,
+                info.endpoints,
+                info.total_records,
+                info.total_bytes,
+                app_metadata=Versions.app_metadata(
+                    self.versions.token([table_key(table)]), self.watermark(table)
+                ),
+            )
 
         query = descriptor.command.decode("utf-8")
-        logger.debug(query)
-        cursor = self.conn.cursor()
-        cursor.execute(query)
-        columns = [(col[0], self.to_pyarrow_type(col[1])) for col in cursor.description]
         endpoint = flight.FlightEndpoint(
             TicketWrapper.ticket_from_command(descriptor.command),
             [self.location],
         )
-        return flight.FlightInfo(pa.schema(columns), descriptor, [endpoint], -1, -1)
+        schema, tables = self.describe_query(query, options)
+        # only SELECTs can be revalidated, they are the only ones with tables
+        app_metadata = b""
+        if tables is not None:
+            app_metadata = Versions.app_metadata(self.versions.token(tables))
+        return flight.FlightInfo(
+            schema, descriptor, [endpoint], -1, -1, app_metadata=app_metadata
+        )
+
+    def table_schema(self, table: Table) -> pa.Schema:
+        table.catalog_name = self.databases.alias(table.database)
+        query = f"SELECT * FROM {table.quoted_name} LIMIT 0"
+        with self.cursor(table.database) as cursor:
+            return cursor.execute(query).fetch_arrow_table().schema
+
+    def watermark(self, table: Table) -> Watermark:
+        def count() -> int:
+            query = f"SELECT coalesce(max(rowid) + 1, 0) FROM {table.quoted_name}"
+            with self.cursor(table.database) as cursor:
+                return cursor.execute(query).fetchone()[0]
+
+        return self.versions.watermark(table_key(table), count)
+
+    def describe_query(
+        self, query: str, options: dict = None
+    ) -> tuple[pa.Schema, list[str] | None]:
+        """Arrow schema of a query and the tables it reads.
+
+        The query is planned with LIMIT 0 so no rows are produced. Statements
+        other than a single SELECT are not run ahead of do_get, their schema is
+        reported as empty and their tables as None.
+        """
+        options = options or {}
+        database, schema_name = options.get("database"), options.get("schema")
+        key = (query, database, schema_name)
+        described = self.schemas.get(key)
+        if described is not None:
+            return described
+
+        statements = duckdb.extract_statements(query)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            return pa.schema([]), None
+
+        logger.debug(query)
+        with self.cursor(database, schema_name) as cursor:
+            schema = cursor.sql(query).limit(0).fetch_arrow_table().schema
+            tables = sorted(cursor.get_table_names(query))
+        self.schemas.put(key, (schema, tables))
+        return schema, tables
+
+    @staticmethod
+    def is_select(query: str) -> bool:
+        statements = duckdb.extract_statements(query)
+        return all(s.type == duckdb.StatementType.SELECT for s in statements)
+
+    @staticmethod
+    def scan_query(tw: TicketWrapper) -> tuple[str, list]:
+        """SELECT for a table ticket with its partition and pushdowns applied."""
+        projection = "*"
+        if tw.columns:
+            projection = ", ".join(quote_identifier(c) for c in tw.columns)
+        query = f"SELECT {projection} FROM {tw.data.quoted_name}"
 
-    def do_get(self, ticket: flight.Ticket, options: dict) -> flight.RecordBatchStream:
-        tw = TicketWrapper.deserialize(ticket.ticket)
+        conditions, params = [], []
+        if tw.partition is not None:
+            start, end = tw.partition
+            conditions.append("rowid >= ?")
+            params.append(start)
+            if end is not None:
+                conditions.append("rowid < ?")
+                params.append(end)
+        for f in tw.filters or []:
+            condition, values = f.to_sql()
+            conditions.append(condition)
+            params.extend(values)
+
+        if conditions:
+            query = f"{query} WHERE {' AND '.join(conditions)}"
+        if tw.limit is not None:
+            query = f"{query} LIMIT {int(tw.limit)}"
+        return query, params
+
+    def do_get(
+        self,
+        ticket: flight.Ticket | TicketWrapper,
+        options: dict,
+        call: CallMetrics = None,
+    ) -> flight.FlightDataStream:
+        call = call or CallMetrics()
+        if isinstance(ticket, TicketWrapper):
+            tw = ticket
+        else:
+            tw = TicketWrapper.deserialize(ticket.ticket)
+        if tw.data_type == DataType.PREPARED:
+            return self.do_get_prepared(tw, options, call)
         if isinstance(tw.data, Table):
-            query = f"SELECT * from {tw.data.qual_name}"
+            if tw.since is not None:
+                since = Watermark.deserialize(tw.since)
+                self.versions.check(table_key(tw.data), since)
+                end = tw.partition[1] if tw.partition is not None else None
+                tw.partition = (since.rows, end)
+            query, params = self.scan_query(tw)
+            # table tickets are fully qualified, they only need their database
+            route = (tw.data.database, None)
         else:
-            query = tw.data
+            query, params = tw.data, None
+            route = (options.get("database"), options.get("schema"))
 
         logger.debug(query)
-        table = self.conn.query(query).arrow()
+        call.query = query
+        write_options = self.write_options(options)
+        if isinstance(tw.data, Table) and not tw.filters:
+            if (snapshot := self.read_snapshot(tw.data)) is not None:
+                logger.debug("Serving snapshot")
+                table = scan(snapshot, tw)
+                call.sent(table.num_rows, table.nbytes)
+                return flight.RecordBatchStream(table, options=write_options)
+        modifies = isinstance(tw.data, str) and not self.is_select(query)
+        cache_key = None
+        if self.results.enabled and not modifies:
+            cache_key = ResultCache.key(tw, options)
+            if (table := self.results.get(cache_key)) is not None:
+                logger.debug("Serving cached result")
+                call.sent(table.num_rows, table.nbytes)
+                return flight.RecordBatchStream(table, options=write_options)
+        generation = self.results.generation
 
-        return flight.RecordBatchStream(table)
+        def cache(cursor: duckdb.DuckDBPyConnection, table: pa.Table):
+            if isinstance(tw.data, Table):
+                tables = [tw.data.name]
+            else:
+                tables = cursor.get_table_names(query)
+            self.results.put(cache_key, table, tables, generation)
 
-    def do_put(self, table: Table, data: pa.Table):
-        query = f"CREATE TABLE IF NOT EXISTS {table.qual_name} AS SELECT * FROM data LIMIT 0"
+        if not self.config.get("streaming"):
+            with self.cursor(*route) as cursor:
+                start = time.perf_counter()
+                table = cursor.execute(query, params).fetch_arrow_table()
+                call.query_seconds += time.perf_counter() - start
+                if cache_key is not None:
+                    cache(cursor, table)
+            if modifies:
+                # ddl through do_get adds or drops tables
+                self.catalog.invalidate()
+                self.invalidate_queries(query)
+            call.sent(table.num_rows, table.nbytes)
+            return flight.RecordBatchStream(table, options=write_options)
+
+        # the stream is consumed after do_get returns, the cursor is released
+        # back to the pool once the last batch has been sent
+        cursor = self.acquire(*route)
+        try:
+            start = time.perf_counter()
+            reader = cursor.execute(query, params).fetch_record_batch(
+                self.config["batch_size"]
+            )
+            call.query_seconds += time.perf_counter() - start
+        except Exception:
+            self.release(cursor)
+            raise
+        if modifies:
+            self.catalog.invalidate()
+            self.invalidate_queries(query)
+        return flight.GeneratorStream(
+            reader.schema,
+            self.stream(
+                cursor, reader, cache if cache_key is not None else None, call
+            ),
+            options=write_options,
+        )
+
+    def execute(
+        self,
+        query: str,
+        on_cursor: Callable[[duckdb.DuckDBPyConnection], None] = None,
+    ) -> pa.Table:
+        """Run ``query`` to completion, ``on_cursor`` sees the cursor first."""
         logger.debug(query)
-        self.conn.execute(query)
-        query = f"INSERT INTO {table.qual_name} SELECT * FROM data"
+        with self.cursor() as cursor:
+            if on_cursor is not None:
+                on_cursor(cursor)
+            table = cursor.execute(query).fetch_arrow_table()
+        if not self.is_select(query):
+            self.catalog.invalidate()
+            self.invalidate_queries(query)
+        return table
+
+    @contextmanager
+    def exchange(
+        self, query: str, source: pa.RecordBatchReader, options: dict
+    ) -> Generator[pa.RecordBatchReader, None, None]:
+        """Reader over ``query`` run with ``source`` as the ``input`` relation.
+
+        ``source`` is scanned as the result is read, once, so the query may
+        only reference ``input`` once.
+        """
+        logger.debug(query)
+        route = (options.get("database"), options.get("schema"))
+        with self.cursor(*route) as cursor:
+            cursor.register(EXCHANGE_INPUT, source)
+            try:
+                yield cursor.execute(query).fetch_record_batch(
+                    self.config["batch_size"]
+                )
+            finally:
+                cursor.unregister(EXCHANGE_INPUT)
+        if not self.is_select(query):
+            self.catalog.invalidate()
+            self.invalidate_queries(query)
+
+    def write_options(self, options: dict) -> pa.ipc.IpcWriteOptions:
+        """Compression asked for by the caller, the configured default otherwise."""
+        if compression := options.get("compression"):
+            return ipc.write_options(compression)
+        return ipc.write_options(
+            self.config["compression"], self.config["compression_level"]
+        )
+
+    def invalidate_queries(self, query: str = None):
+        # ddl may change the schema of cached queries, dml their results
+        self.schemas.clear()
+        self.results.invalidate()
+        self.snapshots.invalidate()
+        self.versions.bump()
+        if query is not None:
+            # only the tables a statement names may have been rewritten
+            self.versions.rewrite_names(mentioned_names(query))
+
+    def read_snapshot(self, table: Table) -> pa.Table | None:
+        if not self.snapshots.wants(table):
+            return None
+        snapshot = self.snapshots.get(table)
+        if snapshot is None:
+            snapshot = self.snapshot(table)
+        return snapshot
+
+    def snapshot(self, table: Table) -> pa.Table | None:
+        """Rebuild the snapshot of ``table`` if it is one of the snapshotted."""
+        if not self.snapshots.wants(table):
+            return None
+        generation = self.snapshots.generation
+        query = f"SELECT rowid AS {ROWID}, * FROM {table.quoted_name} ORDER BY rowid"
+        logger.debug(query)
+        with self.cursor(table.database) as cursor:
+            reader = cursor.execute(query).fetch_record_batch(
+                self.config["batch_size"]
+            )
+            return self.snapshots.write(table, reader, generation)
+
+    def prepare(self, query: str, options: dict = None) -> str:
+        options = options or {}
+        route = (options.get("database"), options.get("schema"))
+        with self.cursor(*route) as cursor:
+            return self.prepared.prepare(cursor, query, route)
+
+    def close_prepared(self, handle: str):
+        self.prepared.close(handle)
+
+    def do_get_prepared(
+        self, tw: TicketWrapper, options: dict, call: CallMetrics = None
+    ) -> flight.FlightDataStream:
+        """Execute a prepared statement once per parameter row."""
+        call = call or CallMetrics()
+        rows = PreparedStatements.parameter_rows(tw.parameters_table)
+        batch_size = self.config["batch_size"]
+        query, route = self.prepared.get(tw.data)
+        call.query = query
+
+        # statements run where they were prepared, handles differ per route
+        cursor = self.acquire(*route)
+        try:
+            start = time.perf_counter()
+            name = self.prepared.ensure(cursor, tw.data)
+            first = cursor.execute(
+                self.prepared.execute_query(name, rows[0])
+            ).fetch_record_batch(batch_size)
+            call.query_seconds += time.perf_counter() - start
+        except Exception:
+            self.release(cursor)
+            raise
+
+        def batches():
+            yield from first
+            for row in rows[1:]:
+                query = self.prepared.execute_query(name, row)
+                yield from cursor.execute(query).fetch_record_batch(batch_size)
+
+        reader = pa.RecordBatchReader.from_batches(first.schema, batches())
+        return flight.GeneratorStream(
+            reader.schema,
+            self.stream(cursor, reader, call=call),
+            options=self.write_options(options),
+        )
+
+    def stream(
+        self,
+        cursor: duckdb.DuckDBPyConnection,
+        reader: pa.RecordBatchReader,
+        cache: Callable[[duckdb.DuckDBPyConnection, pa.Table], None] = None,
+        call: CallMetrics = None,
+    ) -> Generator[pa.RecordBatch, None, None]:
+        call = call or CallMetrics()
+        batches, nbytes = [], 0
+        try:
+            batch_iter = iter(reader)
+            while True:
+                # time spent producing the batch is backend time
+                start = time.perf_counter()
+                batch = next(batch_iter, None)
+                call.query_seconds += time.perf_counter() - start
+                if batch is None:
+                    break
+                call.sent(batch.num_rows, batch.nbytes)
+                if cache is not None:
+                    nbytes += batch.nbytes
+                    if nbytes <= self.results.max_entry_bytes:
+                        batches.append(batch)
+                    else:
+                        cache, batches = None, []
+                yield batch
+            if cache is not None:
+                cache(cursor, pa.Table.from_batches(batches, reader.schema))
+        finally:
+            self.release(cursor)
+
+    def do_put(self, table: Table, data: pa.Table):
+        table.catalog_name = self.databases.alias(table.database)
+        with self.cursor(table.database) as cursor:
+            query = f"CREATE TABLE IF NOT EXISTS {table.quoted_name} AS SELECT * FROM data LIMIT 0"
+            logger.debug(query)
+            cursor.execute(query)
+            query = f"INSERT INTO {table.quoted_name} SELECT * FROM data"
+            logger.debug(query)
+            cursor.execute(query)
+        self.catalog.invalidate(
+            (table.catalog_name, table.schema_or_default(), table.name)
+        )
+        self.results.invalidate(table.name)
+        self.snapshots.invalidate(table)
+        self.versions.bump(table_key(table))
+
+    def import_files(
+        self,
+        request: ImportFiles,
+        on_cursor: Callable[[duckdb.DuckDBPyConnection], None] = None,
+    ) -> int:
+        """Load files into a table, returns the number of rows loaded."""
+        table = Table.from_path(request.table_path)
+        table.catalog_name = self.databases.alias(table.database)
+        paths = [files.check_path(p, self.config["file_root"]) for p in request.paths]
+
+        with self.cursor(table.database) as cursor:
+            if on_cursor is not None:
+                on_cursor(cursor)
+            if request.file_format == "ipc":
+                # duckdb has no ipc reader, it scans an arrow dataset instead
+                source = "ruddy_import"
+                paths = files.expand_paths(paths, self.config["file_root"])
+                cursor.register(source, ds.dataset(paths, format="ipc"))
+            else:
+                source = files.reader_sql(request, paths)
+            try:
+                if request.mode == "replace":
+                    query = f"CREATE OR REPLACE TABLE {table.quoted_name} AS SELECT * FROM {source}"
+                else:
+                    query = f"CREATE TABLE IF NOT EXISTS {table.quoted_name} AS SELECT * FROM {source} LIMIT 0"
+                    logger.debug(query)
+                    cursor.execute(query)
+                    query = f"INSERT INTO {table.quoted_name} SELECT * FROM {source}"
+                logger.debug(query)
+                (rows,) = cursor.execute(query).fetchone()
+            finally:
+                if request.file_format == "ipc":
+                    cursor.unregister(source)
+
+        self.catalog.invalidate(
+            (table.catalog_name, table.schema_or_default(), table.name)
+        )
+        self.results.invalidate(table.name)
+        self.snapshots.invalidate(table)
+        if request.mode == "replace":
+            self.versions.rewrite(table_key(table))
+            self.schemas.clear()
+        else:
+            self.versions.bump(table_key(table))
+        self.snapshot(table)
+        logger.info(f"Imported {rows} rows into {table.qual_name}")
+        return rows
+
+    def export_query(
+        self,
+        request: ExportQuery,
+        on_cursor: Callable[[duckdb.DuckDBPyConnection], None] = None,
+    ) -> int:
+        """Write a query's result to files, returns the number of rows written."""
+        if not self.is_select(request.query):
+            raise ValueError("Only a SELECT statement can be exported")
+        path = files.check_path(request.path, self.config["file_root"])
+        query = files.copy_sql(request, path)
         logger.debug(query)
-        self.conn.execute(query)
+        with self.cursor() as cursor:
+            if on_cursor is not None:
+                on_cursor(cursor)
+            (rows,) = cursor.execute(query).fetchone()
+        logger.info(f"Exported {rows} rows to {path}")
+        return rows
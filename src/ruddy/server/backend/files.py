@@ -0,0 +1,62 @@
+import glob
+import os
+import re
+from typing import Any
+
+from ruddy.models.file_transfer import ExportQuery, ImportFiles
+from ruddy.models.filter import quote_identifier
+from ruddy.server.backend.prepared import sql_literal
+
+OPTION_NAME = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+
+
+def check_path(path: str, root: str | None) -> str:
+    """Absolute ``path``, relative ones under ``root``, which it must lie under.
+
+    Without a root no server side file is accessible.
+    """
+    if root is None:
+        raise PermissionError("Server side files are disabled, FILE_ROOT isn't set")
+    # resolved so a symlink under the root can't lead out of it
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, os.path.expanduser(path)))
+    if os.path.commonpath([root, path]) != root:
+        raise PermissionError(f"'{path}' is outside of the file root")
+    return path
+
+
+def expand_paths(paths: list[str], root: str | None) -> list[str]:
+    """Files matching ``paths``, for readers that take no glob patterns."""
+    expanded = []
+    for pattern in paths:
+        matches = sorted(glob.glob(check_path(pattern, root)))
+        if not matches:
+            raise FileNotFoundError(f"No file matches '{pattern}'")
+        expanded += [check_path(match, root) for match in matches]
+    return expanded
+
+
+def render_options(options: dict[str, Any], separator: str) -> list[str]:
+    rendered = []
+    for name, value in options.items():
+        if not OPTION_NAME.match(name):
+            raise ValueError(f"Invalid option name '{name}'")
+        rendered.append(f"{name}{separator}{sql_literal(value)}")
+    return rendered
+
+
+def reader_sql(request: ImportFiles, paths: list[str]) -> str:
+    """Table function reading the files with DuckDB's parallel readers."""
+    files = "[" + ", ".join(sql_literal(p) for p in paths) + "]"
+    reader = {"parquet": "read_parquet", "csv": "read_csv"}[request.file_format]
+    options = render_options(request.options, " = ")
+    return f"{reader}({', '.join([files, *options])})"
+
+
+def copy_sql(request: ExportQuery, path: str) -> str:
+    options = [f"FORMAT {request.format}"]
+    if request.partition_by:
+        columns = ", ".join(quote_identifier(c) for c in request.partition_by)
+        options.append(f"PARTITION_BY ({columns})")
+    options += render_options(request.options, " ")
+    return f"COPY ({request.query}) TO {sql_literal(path)} ({', '.join(options)})"
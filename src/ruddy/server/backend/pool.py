@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Generator
+
+import duckdb
+import pyarrow.flight as flight
+
+logger = logging.getLogger(__name__)
+
+
+class CursorPool:
+    """Bounded pool of DuckDB cursors handed out one per Flight call.
+
+    At most ``max_size`` cursors are in use at a time. Up to ``max_waiting``
+    callers may queue for a free cursor, each waiting at most ``timeout``
+    seconds; everything beyond that is rejected as unavailable.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], duckdb.DuckDBPyConnection],
+        max_size: int,
+        max_waiting: int,
+        timeout: float = None,
+    ):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.idle: list[duckdb.DuckDBPyConnection] = []
+        self.in_use = 0
+        self.waiting = 0
+
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def acquire(self) -> duckdb.DuckDBPyConnection:
+        start = time.perf_counter()
+        with self.lock:
+            if self.in_use >= self.max_size:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise flight.FlightUnavailableError(
+                        "Too many concurrent requests, try again later"
+                    )
+                self.waiting += 1
+                try:
+                    ok = self.available.wait_for(
+                        lambda: self.in_use < self.max_size, self.timeout
+                    )
+                finally:
+                    self.waiting -= 1
+                if not ok:
+                    self.rejected += 1
+                    raise flight.FlightTimedOutError(
+                        f"Timed out after {self.timeout}s waiting for a cursor"
+                    )
+
+            self.in_use += 1
+            waited = time.perf_counter() - start
+            self.acquired += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+            cursor = self.idle.pop() if self.idle else None
+
+        if cursor is None:
+            try:
+                cursor = self.factory()
+            except Exception:
+                self.release(None)
+                raise
+        return cursor
+
+    def release(self, cursor: duckdb.DuckDBPyConnection | None):
+        with self.lock:
+            if cursor is not None:
+                self.idle.append(cursor)
+            self.in_use -= 1
+            self.available.notify()
+
+    @contextmanager
+    def cursor(self) -> Generator[duckdb.DuckDBPyConnection, None, None]:
+        cursor = self.acquire()
+        try:
+            yield cursor
+        finally:
+            self.release(cursor)
+
+    def close(self):
+        with self.lock:
+            for cursor in self.idle:
+                cursor.close()
+            self.idle = []
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "max_size": self.max_size,
+                "max_waiting": self.max_waiting,
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "waiting": self.waiting,
+                "acquired": self.acquired,
+                "rejected": self.rejected,
+                "wait_time_total": self.wait_time,
+                "wait_time_max": self.max_wait_time,
+                "wait_time_avg": self.wait_time / self.acquired
+                if self.acquired
+                else 0.0,
+            }
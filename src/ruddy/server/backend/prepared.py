@@ -0,0 +1,149 @@
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import math
+import threading
+from typing import Any
+
+import duckdb
+import pyarrow as pa
+
+from ruddy.utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# database and schema a statement runs in
+Route = tuple[str | None, str | None]
+
+
+def sql_literal(value: Any) -> str:
+    """Render a parameter value as a typed SQL constant.
+
+    DuckDB's EXECUTE only takes constants, bound parameters are rejected.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isfinite(value):
+            return f"{value!r}::DOUBLE"
+        return f"'{value}'::DOUBLE"
+    if isinstance(value, decimal.Decimal):
+        if not value.is_finite():
+            return f"'{value}'::DOUBLE"
+        # plain DECIMAL is DECIMAL(18,3), it would round and overflow
+        _, digits, exponent = value.as_tuple()
+        scale = min(max(0, -exponent), 38)
+        precision = min(max(len(digits) + max(0, exponent), scale, 1), 38)
+        return f"'{value}'::DECIMAL({precision},{scale})"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, bytes):
+        return "'" + "".join(f"\\x{b:02x}" for b in value) + "'::BLOB"
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            return f"TIMESTAMPTZ '{value.isoformat()}'"
+        return f"TIMESTAMP '{value.isoformat()}'"
+    if isinstance(value, datetime.date):
+        return f"DATE '{value.isoformat()}'"
+    if isinstance(value, datetime.time):
+        return f"TIME '{value.isoformat()}'"
+    raise TypeError(f"Unsupported parameter type {type(value).__name__}")
+
+
+class PreparedStatements:
+    """Server side prepared statements.
+
+    A handle maps to its query text and the database and schema it was
+    prepared for, at most ``max_statements`` handles are kept. Every pool
+    cursor holds its own bounded set of DuckDB ``PREPARE``d statements,
+    prepared the first time a handle runs on it and deallocated when
+    evicted, so repeated executions skip parsing and planning.
+    """
+
+    def __init__(self, max_statements: int):
+        self.max_statements = max_statements
+        self.queries = LRUCache(max_items=max_statements)
+        self.lock = threading.Lock()
+        self.cursors: dict[int, LRUCache] = {}
+
+    @staticmethod
+    def handle(query: str, route: Route = (None, None)) -> str:
+        key = json.dumps([query, *route])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def name(handle: str) -> str:
+        return f"ruddy_{handle}"
+
+    def prepare(
+        self,
+        cursor: duckdb.DuckDBPyConnection,
+        query: str,
+        route: Route = (None, None),
+    ) -> str:
+        """Handle of ``query``, ``cursor`` must be routed to ``route``."""
+        statements = duckdb.extract_statements(query)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only a single SELECT statement can be prepared")
+
+        handle = self.handle(query, route)
+        self.queries.put(handle, (query, route))
+        self.ensure(cursor, handle)
+        return handle
+
+    def close(self, handle: str):
+        self.queries.pop(handle)
+
+    def get(self, handle: str) -> tuple[str, Route]:
+        """Query and route of ``handle``."""
+        entry = self.queries.get(handle)
+        if entry is None:
+            raise KeyError(f"Unknown prepared statement {handle}, prepare it again")
+        return entry
+
+    def statements(self, cursor: duckdb.DuckDBPyConnection) -> LRUCache:
+        with self.lock:
+            if id(cursor) not in self.cursors:
+
+                def deallocate(handle: str, _):
+                    cursor.execute(f"DEALLOCATE {self.name(handle)}")
+
+                self.cursors[id(cursor)] = LRUCache(
+                    max_items=self.max_statements, on_evict=deallocate
+                )
+            return self.cursors[id(cursor)]
+
+    def ensure(self, cursor: duckdb.DuckDBPyConnection, handle: str) -> str:
+        """Name of ``handle``'s statement on ``cursor``, preparing it if needed."""
+        query, _ = self.get(handle)
+        statements = self.statements(cursor)
+        name = self.name(handle)
+        if statements.get(handle) is None:
+            logger.debug(f"Preparing {name} on cursor {id(cursor)}")
+            cursor.execute(f"PREPARE {name} AS {query}")
+            statements.put(handle, True)
+        return name
+
+    def execute_query(self, name: str, row: dict | None) -> str:
+        if not row:
+            return f"EXECUTE {name}"
+        values = ", ".join(sql_literal(v) for v in row.values())
+        return f"EXECUTE {name}({values})"
+
+    @staticmethod
+    def parameter_rows(parameters: pa.Table | None) -> list[dict | None]:
+        """One execution per parameter row, a single one without parameters."""
+        if parameters is None or not parameters.num_columns:
+            return [None]
+        if not parameters.num_rows:
+            raise ValueError("Parameters have columns but no rows to execute with")
+        return parameters.to_pylist()
+
+    def stats(self) -> dict:
+        return {"statements": len(self.queries), **self.queries.stats()}
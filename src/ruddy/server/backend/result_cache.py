@@ -0,0 +1,84 @@
+import logging
+import threading
+from typing import Hashable, Iterable
+
+import pyarrow as pa
+
+from ruddy.models.table import Table
+from ruddy.models.ticket_wrapper import TicketWrapper
+from ruddy.utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Arrow results of do_get keyed by ticket and the database/schema headers.
+
+    Entries are evicted least recently used first once ``max_bytes`` is
+    exceeded and dropped whenever one of the tables they read from is written.
+    A ``max_bytes`` of 0 disables the cache.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes or max_bytes, max_bytes)
+        self.entries = LRUCache(
+            max_weight=max_bytes, weigher=lambda entry: entry[0].nbytes
+        )
+        self.lock = threading.Lock()
+        # bumped on every invalidation so results computed before a write are
+        # never stored after it
+        self.generation = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(tw: TicketWrapper, options: dict) -> Hashable:
+        if isinstance(tw.data, Table):
+            data = tw.serialize(compact=True)
+        else:
+            data = tw.data.strip()
+        return (data, options.get("database"), options.get("schema"))
+
+    def get(self, key: Hashable) -> pa.Table | None:
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    def put(
+        self, key: Hashable, table: pa.Table, tables: Iterable[str], generation: int
+    ) -> bool:
+        if table.nbytes > self.max_entry_bytes:
+            return False
+        with self.lock:
+            if generation != self.generation:
+                return False
+            names = frozenset(name.lower() for name in tables)
+            return self.entries.put(key, (table, names))
+
+    def invalidate(self, table_name: str = None):
+        with self.lock:
+            self.generation += 1
+            if table_name is None:
+                dropped = len(self.entries)
+                self.entries.clear()
+            else:
+                name = table_name.lower()
+                dropped = 0
+                for key in self.entries.keys():
+                    entry = self.entries.peek(key)
+                    if entry and name in entry[1]:
+                        self.entries.pop(key)
+                        dropped += 1
+            self.invalidations += dropped
+        if dropped:
+            logger.debug(f"Invalidated {dropped} cached results")
+
+    def stats(self) -> dict:
+        return {
+            **self.entries.stats(),
+            "max_bytes": self.max_bytes,
+            "invalidations": self.invalidations,
+        }
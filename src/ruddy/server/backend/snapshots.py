@@ -0,0 +1,145 @@
+import bisect
+import hashlib
+import logging
+import os
+import re
+import threading
+
+import pyarrow as pa
+
+from ruddy.models.table import Table
+from ruddy.models.ticket_wrapper import TicketWrapper
+from ruddy.server.backend.catalog import CatalogKey
+
+logger = logging.getLogger(__name__)
+
+# rowids are kept next to the data so partitioned tickets can be sliced
+ROWID = "__ruddy_rowid"
+
+
+def table_key(table: Table) -> CatalogKey:
+    return (table.catalog_name, table.schema_or_default(), table.name)
+
+
+def as_py(scalar: pa.Scalar):
+    return scalar.as_py()
+
+
+def scan(snapshot: pa.Table, tw: TicketWrapper) -> pa.Table:
+    """Apply a ticket's partition, projection and limit to a snapshot.
+
+    Only slices and column selections are used so the result still points
+    into the memory mapped file.
+    """
+    if tw.partition is not None:
+        rowids = snapshot.column(ROWID)
+        start, end = tw.partition
+        first = bisect.bisect_left(rowids, start, key=as_py)
+        last = len(rowids)
+        if end is not None:
+            last = bisect.bisect_left(rowids, end, first, key=as_py)
+        snapshot = snapshot.slice(first, last - first)
+    if tw.limit is not None:
+        snapshot = snapshot.slice(0, tw.limit)
+    if tw.columns:
+        return snapshot.select(tw.columns)
+    return snapshot.drop_columns([ROWID])
+
+
+class SnapshotStore:
+    """Arrow IPC copies of read mostly tables served through memory maps.
+
+    Only tables listed in ``tables`` (names or qualified names, ``*`` for all)
+    are snapshotted, into ``directory``. A snapshot is dropped whenever its
+    table is written and rebuilt by the next ``write``.
+    """
+
+    def __init__(self, directory: str = None, tables: list[str] = None):
+        self.directory = directory
+        self.tables = {t.lower() for t in tables or []}
+        self.lock = threading.Lock()
+        self.snapshots: dict[CatalogKey, pa.Table] = {}
+        # bumped on every invalidation so a snapshot of data read before a
+        # write is never installed after it
+        self.generation = 0
+        self.hits = 0
+        self.builds = 0
+        self.invalidations = 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory and self.tables)
+
+    def wants(self, table: Table) -> bool:
+        if not self.enabled:
+            return False
+        return bool(
+            {"*", table.name.lower(), table.qual_name.lower()} & self.tables
+        )
+
+    def path(self, key: CatalogKey) -> str:
+        digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()[:16]
+        # quoted identifiers may hold separators, the name is only a hint
+        name = re.sub(r"[^A-Za-z0-9_]", "_", key[2])[:64]
+        return os.path.join(self.directory, f"{name}-{digest}.arrow")
+
+    def get(self, table: Table) -> pa.Table | None:
+        with self.lock:
+            snapshot = self.snapshots.get(table_key(table))
+            if snapshot is not None:
+                self.hits += 1
+        return snapshot
+
+    def write(
+        self, table: Table, reader: pa.RecordBatchReader, generation: int
+    ) -> pa.Table | None:
+        """Write ``reader`` to the table's snapshot file and map it.
+
+        Nothing is installed if the table was written since ``generation``.
+        """
+        key = table_key(table)
+        path = self.path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with pa.OSFile(tmp, "wb") as sink:
+                with pa.ipc.new_file(sink, reader.schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+            with self.lock:
+                if generation != self.generation:
+                    return None
+                os.replace(tmp, path)
+                snapshot = pa.ipc.open_file(pa.memory_map(path)).read_all()
+                self.snapshots[key] = snapshot
+                self.builds += 1
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        logger.debug(f"Snapshotted {snapshot.num_rows} rows of {table.qual_name}")
+        return snapshot
+
+    def invalidate(self, table: Table = None):
+        with self.lock:
+            self.generation += 1
+            if table is None:
+                keys = list(self.snapshots)
+            else:
+                keys = [k for k in [table_key(table)] if k in self.snapshots]
+            for key in keys:
+                # readers still streaming keep their mapping of the unlinked file
+                del self.snapshots[key]
+                if os.path.exists(path := self.path(key)):
+                    os.remove(path)
+            self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "snapshots": len(self.snapshots),
+                "bytes": sum(s.nbytes for s in self.snapshots.values()),
+                "hits": self.hits,
+                "builds": self.builds,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,59 @@
+import logging
+from typing import Iterable
+
+import duckdb
+import pyarrow as pa
+
+from ruddy.utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class ArrowTypes:
+    """DuckDB type names translated by DuckDB's own arrow export.
+
+    Types are resolved by exporting a ``NULL::<type>`` column, so nested,
+    parameterized and extension types come out exactly as do_get streams
+    them. All unknown types of a lookup are resolved in a single query.
+    """
+
+    def __init__(self, max_types: int):
+        self.cache = LRUCache(max_items=max_types)
+
+    @staticmethod
+    def export(
+        cursor: duckdb.DuckDBPyConnection, type_names: list[str]
+    ) -> pa.Schema:
+        columns = ", ".join(f"NULL::{t} AS c{i}" for i, t in enumerate(type_names))
+        return cursor.sql(f"SELECT {columns}").limit(0).fetch_arrow_table().schema
+
+    def resolve(
+        self, cursor: duckdb.DuckDBPyConnection, type_names: Iterable[str]
+    ) -> dict[str, pa.Field]:
+        fields, missing = {}, []
+        for name in dict.fromkeys(type_names):
+            if (field := self.cache.get(name)) is not None:
+                fields[name] = field
+            else:
+                missing.append(name)
+        if not missing:
+            return fields
+
+        try:
+            resolved = dict(zip(missing, self.export(cursor, missing)))
+        except duckdb.Error:
+            # find the offending type, the others are still exact
+            resolved = {}
+            for name in missing:
+                try:
+                    (resolved[name],) = self.export(cursor, [name])
+                except duckdb.Error as e:
+                    logger.warning(f"Can't map {name} to arrow, using string: {e}")
+                    resolved[name] = pa.field("c", pa.string())
+
+        for name, field in resolved.items():
+            self.cache.put(name, field)
+        return {**fields, **resolved}
+
+    def stats(self) -> dict:
+        return self.cache.stats()
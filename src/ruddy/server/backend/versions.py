@@ -0,0 +1,131 @@
+import hashlib
+import json
+import threading
+import uuid
+from typing import Callable, Hashable, Iterable
+
+import duckdb
+
+from ruddy.models.watermark import Watermark
+from ruddy.server.backend.catalog import CatalogKey
+
+NAME_TOKENS = (duckdb.token_type.identifier, duckdb.token_type.keyword)
+
+
+def mentioned_names(query: str) -> set[str]:
+    """Lowercased words of ``query``, a superset of the tables it names."""
+    tokens = duckdb.tokenize(query)
+    ends = [start for start, _ in tokens[1:]] + [len(query)]
+    names = set()
+    for (start, kind), end in zip(tokens, ends):
+        if kind in NAME_TOKENS:
+            word = query[start:end].strip()
+            if word.startswith('"'):
+                word = word[1:-1].replace('""', '"')
+            names.add(word.lower())
+    return names
+
+
+def normalize(key: CatalogKey) -> CatalogKey:
+    return tuple(part.lower() for part in key)
+
+
+class Versions:
+    """Modification counters that let clients tell whether data changed.
+
+    Tables are known by their catalog key, statements only by the names they
+    mention, so counters are kept for both. Every write to a table bumps its
+    counters, statements whose effect isn't known bump a global one too. A
+    token covers a set of tables and changes whenever any of them may have,
+    or the server restarted.
+
+    Appends also move a table's watermark, rows appended after a watermark
+    can be read as a delta until the table is rewritten.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+        self.generation = 0
+        # by catalog key and by table name
+        self.tables: dict[Hashable, int] = {}
+        self.rewrites: dict[Hashable, int] = {}
+        # rowid bounds, kept until the next write to the table
+        self.watermarks: dict[CatalogKey, int] = {}
+
+    def bump(self, key: CatalogKey = None):
+        """Record a write, an append unless the table is ``rewrite``-ed too."""
+        with self.lock:
+            if key is None:
+                self.generation += 1
+                return
+            key = normalize(key)
+            for counter in (key, key[2]):
+                self.tables[counter] = self.tables.get(counter, 0) + 1
+            self.watermarks.pop(key, None)
+
+    def rewrite(self, key: CatalogKey):
+        """Record a write that may have changed or removed existing rows."""
+        with self.lock:
+            key = normalize(key)
+            self.rewrites[key] = self.rewrites.get(key, 0) + 1
+        self.bump(key)
+
+    def rewrite_names(self, names: Iterable[str]):
+        """Record a statement that may have rewritten tables with these names."""
+        names = {name.lower() for name in names}
+        with self.lock:
+            for name in names:
+                self.rewrites[name] = self.rewrites.get(name, 0) + 1
+                self.tables[name] = self.tables.get(name, 0) + 1
+            for key in [k for k in self.watermarks if k[2] in names]:
+                del self.watermarks[key]
+
+    def lineage(self, key: CatalogKey) -> str:
+        key = normalize(key)
+        with self.lock:
+            rewrites = self.rewrites.get(key, 0), self.rewrites.get(key[2], 0)
+        return f"{self.epoch}.{rewrites[0]}.{rewrites[1]}"
+
+    def watermark(self, key: CatalogKey, count: Callable[[], int]) -> Watermark:
+        """Current watermark of a table, ``count`` gives its rowid bound."""
+        key = normalize(key)
+        lineage = self.lineage(key)
+        with self.lock:
+            rows = self.watermarks.get(key)
+            version = (self.tables.get(key, 0), self.tables.get(key[2], 0))
+        if rows is None:
+            rows = count()
+            with self.lock:
+                # a write while counting makes the count stale
+                if version == (self.tables.get(key, 0), self.tables.get(key[2], 0)):
+                    self.watermarks[key] = rows
+        return Watermark(lineage=lineage, rows=rows)
+
+    def check(self, key: CatalogKey, watermark: Watermark):
+        if watermark.lineage != self.lineage(key):
+            raise ValueError(
+                f"Table {'.'.join(key)} was rewritten since watermark "
+                f"{watermark.serialize()}, read it in full"
+            )
+
+    def version(self, key: CatalogKey | str) -> int:
+        """Counter of a table by catalog key, or of every table with a name."""
+        key = key.lower() if isinstance(key, str) else normalize(key)
+        with self.lock:
+            return self.tables.get(key, 0)
+
+    def token(self, keys: Iterable[CatalogKey | str]) -> str:
+        """Token over tables by catalog key, or by name for query results."""
+        keys = [k.lower() if isinstance(k, str) else normalize(k) for k in keys]
+        with self.lock:
+            versions = sorted(([k, self.tables.get(k, 0)] for k in keys), key=str)
+            state = json.dumps([self.epoch, self.generation, versions])
+        return hashlib.sha1(state.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def app_metadata(token: str, watermark: Watermark = None) -> bytes:
+        metadata = {"version": token}
+        if watermark is not None:
+            metadata["watermark"] = watermark.serialize()
+        return json.dumps(metadata).encode("utf-8")
@@ -0,0 +1,352 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.flight as flight
+
+from ruddy.client.client import Client
+from ruddy.models.filter import quote_identifier
+from ruddy.models.placement import Placement
+from ruddy.models.put_progress import PutProgress, requests_flush
+from ruddy.models.table import Table
+from ruddy.server.middleware import (
+    CORE_MIDDLEWARE,
+    METRICS_MIDDLEWARE,
+    CoreMiddleWareFactory,
+    MetricsMiddleware,
+    MetricsMiddlewareFactory,
+)
+from ruddy.settings import settings
+from ruddy.url import URL
+
+logger = logging.getLogger(__name__)
+
+# raised by a node for a table it holds no shard of
+NOT_FOUND = "Couldn't find any dataset"
+
+
+class Placements:
+    """Table to node placements, kept in a json file when given a ``path``."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.placements: dict[tuple[str, ...], Placement] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for data in json.load(f):
+                    placement = Placement(**data)
+                    self.placements[placement.key] = placement
+
+    def get(self, path: list[str]) -> Placement | None:
+        with self.lock:
+            return self.placements.get(tuple(p.lower() for p in path))
+
+    def place(self, placement: Placement) -> Placement:
+        """Record ``placement`` unless the table was placed before."""
+        with self.lock:
+            existing = self.placements.setdefault(placement.key, placement)
+            if existing is placement:
+                self.save()
+        return existing
+
+    def list(self) -> list[Placement]:
+        with self.lock:
+            return list(self.placements.values())
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump([p.model_dump() for p in self.placements.values()], f)
+        os.replace(tmp, self.path)
+
+
+class Coordinator(flight.FlightServerBase):
+    """Shards tables over several ruddy servers, the nodes.
+
+    Tables are placed with ``place`` and a shard key before they are
+    written, do_put hash partitions rows on that key and writes each shard
+    to its node. Flight infos list the endpoints of every node, so clients
+    read the shards from the nodes directly and in parallel. Commands run
+    on the nodes holding a shard of the placed table they read and their
+    results are concatenated, so only row-wise SELECTs over a single table
+    are accepted.
+    """
+
+    def __init__(self, url: str | URL, nodes: list[str | URL], placements: str = None):
+        self.url = URL.init(url)
+        self.metrics = MetricsMiddlewareFactory(
+            slow_query_seconds=settings.SLOW_QUERY_SECONDS
+        )
+        super().__init__(
+            self.url.location,
+            middleware={
+                CORE_MIDDLEWARE: CoreMiddleWareFactory(),
+                METRICS_MIDDLEWARE: self.metrics,
+            },
+        )
+        self.nodes = {URL.init(node).location: Client(node) for node in nodes}
+        self.placements = Placements(placements)
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(self.nodes), thread_name_prefix="ruddy-coordinator"
+        )
+        # only computes shard hashes, it holds no data
+        self.hasher = duckdb.connect()
+        self.aggregates = {
+            name
+            for (name,) in self.hasher.execute(
+                "SELECT DISTINCT function_name FROM duckdb_functions() "
+                "WHERE function_type = 'aggregate'"
+            ).fetchall()
+        }
+        logger.debug(f"Initialized coordinator over {len(self.nodes)} nodes.")
+
+    def list_actions(self, context: flight.ServerCallContext):
+        return [
+            ("placements", "Get the nodes and shard key of every placed table."),
+            ("place", "Place a table, with its shard key, before it is written."),
+        ]
+
+    def placement(self, path: list[str], shard_key: str) -> Placement:
+        return self.placements.place(
+            Placement(path=path, nodes=list(self.nodes), shard_key=shard_key)
+        )
+
+    def check_row_wise(self, query: str) -> Table:
+        """Raise unless ``query`` gives the same rows run per shard or globally.
+
+        Returns the table it reads.
+        """
+        cursor = self.hasher.cursor()
+        try:
+            (tree,) = cursor.execute("SELECT json_serialize_sql(?)", [query]).fetchone()
+        finally:
+            cursor.close()
+        tree = json.loads(tree)
+        if tree["error"] or len(tree["statements"]) != 1:
+            raise ValueError("A coordinator only runs single SELECT statements")
+
+        node = tree["statements"][0]["node"]
+        row_wise = (
+            node["type"] == "SELECT_NODE"
+            and not node["modifiers"]
+            and not node["cte_map"]["map"]
+            and not node["group_expressions"]
+            and not node["group_sets"]
+            and node["having"] is None
+            and node["qualify"] is None
+            and node["sample"] is None
+            and node["from_table"]["type"] == "BASE_TABLE"
+        )
+        expressions = [node]
+        while row_wise and expressions:
+            expression = expressions.pop()
+            if isinstance(expression, list):
+                expressions.extend(expression)
+            elif isinstance(expression, dict):
+                kind = expression.get("class")
+                if kind in ("WINDOW", "SUBQUERY") or (
+                    kind == "FUNCTION"
+                    and expression["function_name"].lower() in self.aggregates
+                ):
+                    row_wise = False
+                expressions.extend(expression.values())
+        if not row_wise:
+            raise ValueError(
+                "A coordinator only runs row-wise queries over one table, "
+                "without aggregates, ordering, limits, distinct or subqueries"
+            )
+        source = node["from_table"]
+        return Table.from_path(
+            [source["catalog_name"], source["schema_name"], source["table_name"]]
+        )
+
+    def shards(
+        self, placement: Placement, data: pa.Table
+    ) -> list[tuple[str, pa.Table]]:
+        count = len(placement.nodes)
+        query = (
+            f"SELECT (hash({quote_identifier(placement.shard_key)}) % {count})"
+            "::INTEGER AS shard FROM data"
+        )
+        cursor = self.hasher.cursor()
+        try:
+            shard = cursor.execute(query).fetch_arrow_table()["shard"]
+        finally:
+            cursor.close()
+        shards = []
+        for index, node in enumerate(placement.nodes):
+            part = data.filter(pc.equal(shard, index))
+            if part.num_rows:
+                shards.append((node, part))
+        return shards
+
+    def list_flights(self, context: flight.ServerCallContext, criteria: bytes):
+        for placement in self.placements.list():
+            descriptor = flight.FlightDescriptor.for_path(*placement.path)
+            try:
+                yield self.table_info(placement, descriptor)
+            except ValueError:
+                continue
+
+    def get_flight_info(
+        self, context: flight.ServerCallContext, descriptor: flight.FlightDescriptor
+    ):
+        if descriptor.descriptor_type == flight.DescriptorType.PATH:
+            path = Table.from_path(descriptor.path)
+            placement = self.placements.get(
+                [path.database_or_default(), path.schema_or_default(), path.name]
+            )
+            if placement is None:
+                raise ValueError(NOT_FOUND)
+            return self.table_info(placement, descriptor)
+
+        command = descriptor.command.decode("utf-8")
+        table = self.check_row_wise(command)
+        placement = self.placements.get(
+            [table.database_or_default(), table.schema_or_default(), table.name]
+        )
+        if placement is None:
+            raise ValueError(f"Table {table.qual_name} isn't placed on the nodes")
+        missing = f"Table with name {table.name} does not exist"
+
+        def node_info(node: str) -> flight.FlightInfo | None:
+            try:
+                return self.nodes[node].get_flight_info_for_command(command)
+            except (pa.ArrowInvalid, flight.FlightServerError) as e:
+                # the node has no shard yet, as in table_info
+                if missing not in str(e):
+                    raise
+                return None
+
+        infos = [i for i in self.executor.map(node_info, placement.nodes) if i]
+        if not infos:
+            raise ValueError(NOT_FOUND)
+        return self.merge(descriptor, infos)
+
+    def table_info(
+        self, placement: Placement, descriptor: flight.FlightDescriptor
+    ) -> flight.FlightInfo:
+        def node_info(node: str) -> flight.FlightInfo | None:
+            try:
+                return self.nodes[node].get_flight_info_for_path(*placement.path)
+            except (pa.ArrowInvalid, flight.FlightServerError, KeyError) as e:
+                # no row hashed to this node yet, its shard doesn't exist, any
+                # other error, an unavailable node too, fails the read
+                if NOT_FOUND not in str(e):
+                    raise
+                return None
+
+        infos = [i for i in self.executor.map(node_info, placement.nodes) if i]
+        if not infos:
+            raise ValueError(NOT_FOUND)
+        return self.merge(descriptor, infos)
+
+    @staticmethod
+    def merge(
+        descriptor: flight.FlightDescriptor, infos: list[flight.FlightInfo]
+    ) -> flight.FlightInfo:
+        endpoints = [e for info in infos for e in info.endpoints]
+        records = [info.total_records for info in infos]
+        nbytes = [info.total_bytes for info in infos]
+        # versioned only while every shard is
+        versions = [json.loads(i.app_metadata or b"{}").get("version") for i in infos]
+        app_metadata = b""
+        if all(versions):
+            version = hashlib.sha1("".join(versions).encode("utf-8")).hexdigest()[:16]
+            app_metadata = json.dumps({"version": version}).encode("utf-8")
+        return flight.FlightInfo(
+            infos[0].schema,
+            descriptor,
+            endpoints,
+            sum(records) if min(records) >= 0 else -1,
+            sum(nbytes) if min(nbytes) >= 0 else -1,
+            app_metadata=app_metadata,
+        )
+
+    def do_get(self, context: flight.ServerCallContext, ticket: flight.Ticket):
+        raise flight.FlightServerError("Tickets are served by the nodes")
+
+    def do_put(
+        self,
+        context: flight.ServerCallContext,
+        descriptor: flight.FlightDescriptor,
+        reader: flight.MetadataRecordBatchReader,
+        writer: flight.FlightMetadataWriter,
+    ):
+        mm: MetricsMiddleware = context.get_middleware(METRICS_MIDDLEWARE)
+        table = Table.from_path(descriptor.path)
+        path = [table.database_or_default(), table.schema_or_default(), table.name]
+        placement = self.placements.get(path)
+        if placement is None:
+            raise flight.FlightServerError(
+                f"Table {table.qual_name} isn't placed, place it with a shard key first"
+            )
+        if placement.shard_key not in reader.schema.names:
+            raise flight.FlightServerError(
+                f"Shard key {placement.shard_key} is missing from the data"
+            )
+        mm.call.query = f"put {table.qual_name}"
+        logger.info(f"Sharding data for table {table.qual_name}")
+
+        progress = PutProgress()
+        target = Table.from_path(path)
+        batches: list[pa.RecordBatch] = []
+        rows, nbytes = 0, 0
+
+        # one put per node for every flush, like Server.do_put commits
+        def flush():
+            nonlocal batches, rows, nbytes
+            data = pa.Table.from_batches(batches)
+            list(
+                self.executor.map(
+                    lambda shard: self.nodes[shard[0]].do_put(target, shard[1]),
+                    self.shards(placement, data),
+                )
+            )
+            mm.call.received(rows, nbytes)
+            progress.rows += rows
+            progress.nbytes += nbytes
+            writer.write(progress.buffer)
+            batches, rows, nbytes = [], 0, 0
+
+        for chunk in reader:
+            if chunk.data is None:
+                continue
+            batches.append(chunk.data)
+            rows += chunk.data.num_rows
+            nbytes += chunk.data.nbytes
+            if (
+                rows >= settings.PUT_FLUSH_ROWS
+                or nbytes >= settings.PUT_FLUSH_BYTES
+                or requests_flush(chunk.app_metadata)
+            ):
+                flush()
+
+        if batches:
+            flush()
+
+    def do_action(self, context, action):
+        if action.type == "placements":
+            placements = [p.model_dump() for p in self.placements.list()]
+            return iter([flight.Result(json.dumps(placements).encode("utf-8"))])
+        if action.type == "place":
+            body = json.loads(action.body.to_pybytes())
+            placement = self.placement(body["path"], body["shard_key"])
+            return iter([flight.Result(placement.model_dump_json().encode("utf-8"))])
+        raise flight.FlightServerError(f"Unknown action {action.type}")
+
+    def shutdown(self) -> None:
+        super().shutdown()
+        self.executor.shutdown()
+        for node in self.nodes.values():
+            node.close()
+        self.hasher.close()
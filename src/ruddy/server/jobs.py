@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import duckdb
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+
+class JobState:
+    PENDING: str = "pending"
+    RUNNING: str = "running"
+    DONE: str = "done"
+    FAILED: str = "failed"
+    CANCELLED: str = "cancelled"
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+
+OnCursor = Callable[[duckdb.DuckDBPyConnection], None]
+
+
+class Job:
+    def __init__(self, query: str, task: Callable[[OnCursor], pa.Table] = None):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.task = task
+        self.state = JobState.PENDING
+        self.error: str = None
+        self.result: pa.Table = None
+        self.submitted = time.time()
+        self.started: float = None
+        self.finished: float = None
+        self.cursor: duckdb.DuckDBPyConnection = None
+        self.future: Future = None
+        self.cancel_requested = False
+
+    @property
+    def done(self) -> bool:
+        return self.state in JobState.FINISHED
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "query": self.query,
+            "state": self.state,
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "rows": None if self.result is None else self.result.num_rows,
+        }
+
+
+Execute = Callable[[str, OnCursor], pa.Table]
+
+
+class JobManager:
+    """Runs long statements in the background on a dedicated thread pool.
+
+    ``execute`` runs a query and reports the cursor it runs on so a running
+    job can be interrupted, jobs with their own ``task`` do the same.
+    Finished jobs are kept, oldest dropped first, up to ``history``.
+    """
+
+    def __init__(self, execute: Execute, max_workers: int, history: int):
+        self.execute = execute
+        self.history = history
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ruddy-job"
+        )
+        self.lock = threading.Lock()
+        self.jobs: dict[str, Job] = {}
+
+    def submit(self, query: str, task: Callable[[OnCursor], pa.Table] = None) -> Job:
+        job = Job(query, task)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.prune()
+        job.future = self.executor.submit(self.run, job)
+        logger.info(f"Submitted job {job.id}")
+        return job
+
+    def run(self, job: Job):
+        def attach(cursor: duckdb.DuckDBPyConnection):
+            with self.lock:
+                job.cursor = cursor
+                job.state = JobState.RUNNING
+                job.started = time.time()
+                cancelled = job.cancel_requested
+            if cancelled:
+                cursor.interrupt()
+
+        try:
+            with self.lock:
+                if job.cancel_requested:
+                    return
+            if job.task is not None:
+                result = job.task(attach)
+            else:
+                result = self.execute(job.query, attach)
+        except Exception as e:
+            with self.lock:
+                if job.cancel_requested:
+                    job.state = JobState.CANCELLED
+                else:
+                    job.state = JobState.FAILED
+                    job.error = str(e)
+            if job.state == JobState.FAILED:
+                logger.warning(f"Job {job.id} failed: {e}")
+        else:
+            with self.lock:
+                job.result = result
+                job.state = JobState.DONE
+        finally:
+            with self.lock:
+                job.cursor = None
+                if job.cancel_requested and job.state != JobState.DONE:
+                    job.state = JobState.CANCELLED
+                job.finished = time.time()
+            logger.info(f"Job {job.id} {job.state}")
+
+    def get(self, job_id: str) -> Job:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job {job_id}")
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        with self.lock:
+            if job.done:
+                return job
+            job.cancel_requested = True
+            if job.future.cancel():
+                job.state = JobState.CANCELLED
+                job.finished = time.time()
+            elif job.cursor is not None:
+                job.cursor.interrupt()
+        return job
+
+    def result(self, job_id: str) -> pa.Table:
+        job = self.get(job_id)
+        if job.state == JobState.FAILED:
+            raise RuntimeError(f"Job {job_id} failed: {job.error}")
+        if job.state != JobState.DONE:
+            raise ValueError(f"Job {job_id} is {job.state}, it has no result yet")
+        return job.result
+
+    def prune(self):
+        finished = [job for job in self.jobs.values() if job.done]
+        for job in finished[: max(0, len(finished) - self.history)]:
+            del self.jobs[job.id]
+
+    def stats(self) -> dict:
+        with self.lock:
+            states = [job.state for job in self.jobs.values()]
+        return {state: states.count(state) for state in set(states)}
+
+    def close(self):
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if not job.done]
+        for job in jobs:
+            self.cancel(job.id)
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -2,8 +2,14 @@ from ruddy.server.middleware.core_middleware import (
     CoreMiddleWareFactory,
     CoreMiddleware,
 )
+from ruddy.server.middleware.metrics_middleware import (
+    CallMetrics,
+    MetricsMiddleware,
+    MetricsMiddlewareFactory,
+)
 
 CORE_MIDDLEWARE = "__core__"
+METRICS_MIDDLEWARE = "__metrics__"
 
 middlewares = {
     CORE_MIDDLEWARE: CoreMiddleWareFactory(),
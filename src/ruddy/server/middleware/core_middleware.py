@@ -11,6 +11,7 @@ class CoreMiddleware(flight.ServerMiddleware):
         self.input_headers = {
             "database": _.chain(input_headers).get("database").nth(0).value(),
             "schema": _.chain(input_headers).get("schema").nth(0).value(),
+            "compression": _.chain(input_headers).get("compression").nth(0).value(),
             "request_id": request_id,
         }
         self.output_headers = {
@@ -0,0 +1,128 @@
+import logging
+import time
+
+import pyarrow.flight as flight
+import pydash as _
+
+from ruddy.utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# calls that only return metadata, they have no streaming phase
+METADATA_METHODS = {
+    "list_flights",
+    "get_flight_info",
+    "get_schema",
+    "list_actions",
+    "handshake",
+}
+
+
+def server_metrics() -> Metrics:
+    metrics = Metrics()
+    metrics.counter("ruddy_rpc_calls_total", "Flight calls by method and status.")
+    metrics.histogram("ruddy_rpc_seconds", "Latency of flight calls.")
+    metrics.histogram(
+        "ruddy_rpc_phase_seconds",
+        "Latency of flight calls split into metadata, execution and streaming.",
+    )
+    metrics.histogram("ruddy_query_seconds", "Time spent in the backend per call.")
+    metrics.counter("ruddy_rows_sent_total", "Rows streamed to clients.")
+    metrics.counter("ruddy_bytes_sent_total", "Arrow bytes streamed to clients.")
+    metrics.counter("ruddy_rows_received_total", "Rows uploaded by clients.")
+    metrics.counter("ruddy_bytes_received_total", "Arrow bytes uploaded by clients.")
+    metrics.counter("ruddy_slow_calls_total", "Calls over the slow query threshold.")
+    return metrics
+
+
+class CallMetrics:
+    """What one call did, filled in by the server and the backend."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.handled: float = None
+        self.query: str = None
+        self.query_seconds = 0.0
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.rows_received = 0
+        self.bytes_received = 0
+
+    def handler_done(self):
+        """The handler returned, anything after this is streaming."""
+        self.handled = time.perf_counter()
+
+    def sent(self, rows: int, nbytes: int):
+        self.rows_sent += rows
+        self.bytes_sent += nbytes
+
+    def received(self, rows: int, nbytes: int):
+        self.rows_received += rows
+        self.bytes_received += nbytes
+
+
+class MetricsMiddleware(flight.ServerMiddleware):
+    def __init__(
+        self, factory: "MetricsMiddlewareFactory", method: str, request_id: str
+    ):
+        self.factory = factory
+        self.method = method
+        self.request_id = request_id
+        self.call = CallMetrics()
+
+    def call_completed(self, exception):
+        self.factory.record(self, exception)
+
+
+class MetricsMiddlewareFactory(flight.ServerMiddlewareFactory):
+    """Per call latency, row and byte accounting with optional slow query logs."""
+
+    def __init__(self, metrics: Metrics = None, slow_query_seconds: float = None):
+        super(MetricsMiddlewareFactory, self).__init__()
+        self.metrics = metrics or server_metrics()
+        self.slow_query_seconds = slow_query_seconds
+
+    def start_call(self, info, headers):
+        request_id = _.chain(headers).get("request_id").nth(0).value()
+        return MetricsMiddleware(self, info.method.name.lower(), request_id)
+
+    def record(self, middleware: MetricsMiddleware, exception):
+        call, method = middleware.call, middleware.method
+        finished = time.perf_counter()
+        total = finished - call.started
+        status = "ok" if exception is None else type(exception).__name__
+
+        metrics = self.metrics
+        metrics.inc("ruddy_rpc_calls_total", method=method, status=status)
+        metrics.observe("ruddy_rpc_seconds", total, method=method)
+        if call.handled is not None:
+            phases = {
+                "execution": call.handled - call.started,
+                "streaming": finished - call.handled,
+            }
+        elif method in METADATA_METHODS:
+            phases = {"metadata": total}
+        else:
+            phases = {"execution": total}
+        for phase, seconds in phases.items():
+            metrics.observe(
+                "ruddy_rpc_phase_seconds", seconds, method=method, phase=phase
+            )
+        if call.query is not None:
+            metrics.observe("ruddy_query_seconds", call.query_seconds, method=method)
+        if call.rows_sent or call.bytes_sent:
+            metrics.inc("ruddy_rows_sent_total", call.rows_sent, method=method)
+            metrics.inc("ruddy_bytes_sent_total", call.bytes_sent, method=method)
+        if call.rows_received or call.bytes_received:
+            metrics.inc("ruddy_rows_received_total", call.rows_received, method=method)
+            metrics.inc(
+                "ruddy_bytes_received_total", call.bytes_received, method=method
+            )
+
+        if self.slow_query_seconds is not None and total >= self.slow_query_seconds:
+            metrics.inc("ruddy_slow_calls_total", method=method)
+            logger.warning(
+                f"Slow {method} request_id={middleware.request_id} took {total:.3f}s "
+                f"(backend {call.query_seconds:.3f}s, {call.rows_sent} rows sent, "
+                f"{call.rows_received} rows received): {call.query}"
+            )
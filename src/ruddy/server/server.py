@@ -1,28 +1,46 @@
-import asyncio
+import json
 import logging
+import time
 
 import pyarrow as pa
 import pyarrow.flight as flight
 
+from ruddy.models.file_transfer import ExportQuery, ImportFiles
+from ruddy.models.put_progress import PutProgress, requests_flush
 from ruddy.models.table import Table
+from ruddy.models.ticket_wrapper import DataType, TicketWrapper
 from ruddy.server.backend import Duckdb
+from ruddy.server.backend.snapshots import table_key
+from ruddy.server.jobs import JobManager
 from ruddy.server.middleware import (
     CORE_MIDDLEWARE,
+    METRICS_MIDDLEWARE,
     CoreMiddleware,
     CoreMiddleWareFactory,
+    MetricsMiddleware,
+    MetricsMiddlewareFactory,
 )
+from ruddy.server.subscriptions import Subscription, Subscriptions
+from ruddy.settings import settings
 from ruddy.url import URL
 
 logger = logging.getLogger(__name__)
 
+# seconds an idle subscription stream waits before checking for cancellation
+SUBSCRIPTION_POLL_SECONDS = 0.5
+
 
 class Server(flight.FlightServerBase):
     def __init__(self, url: str | URL):
         self.url = URL.init(url)
+        self.metrics = MetricsMiddlewareFactory(
+            slow_query_seconds=settings.SLOW_QUERY_SECONDS
+        )
         super().__init__(
             self.url.location,
             middleware={
                 CORE_MIDDLEWARE: CoreMiddleWareFactory(),
+                METRICS_MIDDLEWARE: self.metrics,
             },
         )
 
@@ -32,15 +50,32 @@ class Server(flight.FlightServerBase):
         if self.url.schema:
             backend_config["schema"] = self.url.schema
         self.backend = Duckdb(config=backend_config)
+        self.jobs = JobManager(
+            self.backend.execute,
+            max_workers=settings.JOB_WORKERS,
+            history=settings.JOB_HISTORY,
+        )
+        self.subscriptions = Subscriptions(settings.SUBSCRIPTION_BUFFER_BYTES)
         logger.debug("Initialized server.")
 
     def list_actions(self, context: flight.ServerCallContext):
-        # todo
-        return [("get-trace-id", "Get the trace context ID.")]
+        return [
+            ("pool-stats", "Get occupancy and wait times of the cursor pool."),
+            ("cache-stats", "Get hit, miss and eviction counters of the caches."),
+            ("metrics", "Get call latency, row and byte counts in Prometheus format."),
+            ("prepare", "Prepare a SELECT statement, returns its handle."),
+            ("close-prepared", "Release the prepared statement with the given handle."),
+            ("submit-job", "Run a statement in the background, returns its status."),
+            ("job-status", "Get the status of the job with the given id."),
+            ("cancel-job", "Cancel the job with the given id."),
+            ("job-result", "Get the ticket of a finished job's result."),
+            ("import", "Load Parquet, CSV or Arrow IPC files into a table."),
+            ("export", "Write a query to server side, optionally partitioned, files."),
+        ]
 
     def list_flights(self, context: flight.ServerCallContext, criteria: bytes):
         cm: CoreMiddleware = context.get_middleware(CORE_MIDDLEWARE)
-        return self.backend.list_flights(cm.input_headers, context, criteria)
+        return self.backend.list_flights(cm.input_headers)
 
     def get_flight_info(
         self, context: flight.ServerCallContext, descriptor: flight.FlightDescriptor
@@ -50,7 +85,45 @@ class Server(flight.FlightServerBase):
 
     def do_get(self, context: flight.ServerCallContext, ticket: flight.Ticket):
         cm: CoreMiddleware = context.get_middleware(CORE_MIDDLEWARE)
-        return self.backend.do_get(ticket, cm.input_headers)
+        mm: MetricsMiddleware = context.get_middleware(METRICS_MIDDLEWARE)
+        tw = TicketWrapper.deserialize(ticket.ticket)
+        if tw.data_type == DataType.SUBSCRIPTION:
+            schema = self.backend.table_schema(tw.data)
+            subscription = self.subscriptions.subscribe(table_key(tw.data), schema)
+            mm.call.query = f"subscribe {tw.data.qual_name}"
+            stream = flight.GeneratorStream(
+                schema,
+                self.stream_subscription(subscription, context, mm),
+                options=self.backend.write_options(cm.input_headers),
+            )
+        elif tw.data_type == DataType.JOB:
+            table = self.jobs.result(tw.data)
+            mm.call.sent(table.num_rows, table.nbytes)
+            stream = flight.RecordBatchStream(
+                table, options=self.backend.write_options(cm.input_headers)
+            )
+        else:
+            stream = self.backend.do_get(tw, cm.input_headers, mm.call)
+        mm.call.handler_done()
+        return stream
+
+    def stream_subscription(
+        self,
+        subscription: Subscription,
+        context: flight.ServerCallContext,
+        mm: MetricsMiddleware,
+    ):
+        try:
+            # an idle stream would not notice a reader that went away
+            for batch in subscription.poll(SUBSCRIPTION_POLL_SECONDS):
+                if context.is_cancelled():
+                    break
+                if batch is None:
+                    continue
+                mm.call.sent(batch.num_rows, batch.nbytes)
+                yield batch
+        finally:
+            self.subscriptions.unsubscribe(subscription)
 
     def do_put(
         self,
@@ -59,44 +132,167 @@ class Server(flight.FlightServerBase):
         reader: flight.MetadataRecordBatchReader,
         writer: flight.FlightMetadataWriter,
     ):
+        mm: MetricsMiddleware = context.get_middleware(METRICS_MIDDLEWARE)
         table = Table.from_path(descriptor.path)
+        mm.call.query = f"put {table.qual_name}"
         logger.info(f"Receiving data for table: {table.qual_name}")
 
-        batches = []
-        try:
-            while True:
-                chunk: flight.FlightStreamChunk = reader.read_chunk()
-                batches.append(chunk.data)
-        except StopIteration:
-            pass  # Handle end of data gracefully
+        progress = PutProgress()
+        batches: list[pa.RecordBatch] = []
+        rows, nbytes = 0, 0
+
+        def flush():
+            nonlocal batches, rows, nbytes
+            start = time.perf_counter()
+            data = pa.Table.from_batches(batches)
+            self.backend.do_put(table=table, data=data)
+            mm.call.query_seconds += time.perf_counter() - start
+            self.subscriptions.publish(table_key(table), data)
+            mm.call.received(rows, nbytes)
+            progress.rows += rows
+            progress.nbytes += nbytes
+            writer.write(progress.buffer)
+            logger.debug(f"Committed {progress.rows} rows to {table.qual_name}")
+            batches, rows, nbytes = [], 0, 0
+
+        for chunk in reader:
+            if chunk.data is None:
+                continue
+            batches.append(chunk.data)
+            rows += chunk.data.num_rows
+            nbytes += chunk.data.nbytes
+            if (
+                rows >= settings.PUT_FLUSH_ROWS
+                or nbytes >= settings.PUT_FLUSH_BYTES
+                or requests_flush(chunk.app_metadata)
+            ):
+                flush()
 
         if batches:
-            self.backend.do_put(
-                table=Table.from_path(descriptor.path),
-                data=pa.Table.from_batches(batches),
-            )
-        else:
+            flush()
+
+        if not progress.rows:
             logger.info("Nothing to write!")
+        else:
+            self.backend.snapshot(table)
 
-        try:
-            writer.close()
-        except Exception as e:
-            logger.error(f"Error closing writer: {e}")
+    def do_exchange(
+        self,
+        context: flight.ServerCallContext,
+        descriptor: flight.FlightDescriptor,
+        reader: flight.MetadataRecordBatchReader,
+        writer: flight.MetadataRecordBatchWriter,
+    ):
+        cm: CoreMiddleware = context.get_middleware(CORE_MIDDLEWARE)
+        mm: MetricsMiddleware = context.get_middleware(METRICS_MIDDLEWARE)
+        if descriptor.descriptor_type != flight.DescriptorType.CMD:
+            raise flight.FlightServerError("do_exchange takes a command descriptor")
+        query = descriptor.command.decode("utf-8")
+        mm.call.query = query
 
-    async def async_operation(self):
-        await asyncio.sleep(5)  # Simulate a long operation
-        return pa.scalar("Operation completed")
+        def batches():
+            for chunk in reader:
+                if chunk.data is not None:
+                    mm.call.received(chunk.data.num_rows, chunk.data.nbytes)
+                    yield chunk.data
 
-    async def async_operation(self, action_id):
-        await asyncio.sleep(5)  # Simulate a long operation
-        self.results[action_id] = "Operation completed"
+        source = pa.RecordBatchReader.from_batches(reader.schema, batches())
+        start = time.perf_counter()
+        with self.backend.exchange(query, source, cm.input_headers) as result:
+            writer.begin(
+                result.schema, options=self.backend.write_options(cm.input_headers)
+            )
+            for batch in result:
+                mm.call.sent(batch.num_rows, batch.nbytes)
+                writer.write_batch(batch)
+        mm.call.query_seconds += time.perf_counter() - start
+        mm.call.handler_done()
 
     def do_action(self, context, action):
-        action_id = action.body.to_pybytes().decode()
-        asyncio.create_task(self.async_operation(action_id))
-        return iter([flight.Result(pa.scalar("Action started").to_string())])
+        if action.type == "pool-stats":
+            stats = {
+                **self.backend.pool.stats(),
+                "databases": self.backend.databases.stats(),
+                "subscriptions": self.subscriptions.stats(),
+            }
+            stats = json.dumps(stats).encode("utf-8")
+            return iter([flight.Result(stats)])
+        if action.type == "metrics":
+            return iter([flight.Result(self.metrics.metrics.render().encode("utf-8"))])
+        if action.type == "cache-stats":
+            stats = {
+                "results": self.backend.results.stats(),
+                "schemas": self.backend.schemas.stats(),
+                "arrow_types": self.backend.arrow_types.stats(),
+                "prepared": self.backend.prepared.stats(),
+                "snapshots": self.backend.snapshots.stats(),
+                "jobs": self.jobs.stats(),
+            }
+            return iter([flight.Result(json.dumps(stats).encode("utf-8"))])
+        if action.type == "prepare":
+            cm: CoreMiddleware = context.get_middleware(CORE_MIDDLEWARE)
+            query = action.body.to_pybytes().decode("utf-8")
+            handle = self.backend.prepare(query, cm.input_headers)
+            return iter([flight.Result(json.dumps({"handle": handle}).encode("utf-8"))])
+        if action.type == "close-prepared":
+            self.backend.close_prepared(action.body.to_pybytes().decode("utf-8"))
+            return iter([])
+        if action.type in ("submit-job", "job-status", "cancel-job"):
+            body = action.body.to_pybytes().decode("utf-8")
+            if action.type == "submit-job":
+                job = self.jobs.submit(body)
+            elif action.type == "job-status":
+                job = self.jobs.get(body)
+            else:
+                job = self.jobs.cancel(body)
+            return iter([flight.Result(json.dumps(job.to_dict()).encode("utf-8"))])
+        if action.type == "job-result":
+            job_id = action.body.to_pybytes().decode("utf-8")
+            self.jobs.result(job_id)
+            return iter([flight.Result(TicketWrapper.from_job(job_id).serialize())])
+
+        if action.type in ("import", "export"):
+            return self.transfer_files(action)
+
+        raise flight.FlightServerError(f"Unknown action {action.type}")
+
+    def transfer_files(self, action: flight.Action):
+        if self.backend.config["file_root"] is None:
+            # refused up front, background jobs would only fail later
+            raise flight.FlightServerError(
+                "Server side files are disabled, FILE_ROOT isn't set"
+            )
+        body = action.body.to_pybytes()
+        if action.type == "import":
+            request = ImportFiles.model_validate_json(body)
+            run = self.backend.import_files
+            description = f"import {request.path} into {request.table}"
+        else:
+            request = ExportQuery.model_validate_json(body)
+            run = self.backend.export_query
+            description = f"export {request.query} to {request.path}"
+
+        if request.background:
+
+            def task(on_cursor) -> pa.Table:
+                return pa.table({"rows": [run(request, on_cursor)]})
+
+            job = self.jobs.submit(description, task)
+            result = job.to_dict()
+        else:
+            result = {"rows": run(request)}
+        return iter([flight.Result(json.dumps(result).encode("utf-8"))])
+
+    def shutdown(self) -> None:
+        # open subscription streams would keep the server from stopping
+        self.subscriptions.close()
+        super().shutdown()
 
     def serve(self) -> None:
         self.backend.connect()
         logger.info(f"Connected to backend and started on {self.url}")
-        super().serve()
+        try:
+            super().serve()
+        finally:
+            self.jobs.close()
+            self.backend.close()
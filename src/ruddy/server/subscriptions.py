@@ -0,0 +1,143 @@
+import logging
+import threading
+import uuid
+from collections import deque
+from typing import Generator, Hashable
+
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Batches committed to one table, buffered for a single reader.
+
+    The buffer holds up to ``max_bytes``, a reader that falls further behind
+    is cut off instead of holding up writers or growing without bound.
+    """
+
+    def __init__(self, key: Hashable, schema: pa.Schema, max_bytes: int):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.schema = schema
+        self.max_bytes = max_bytes
+        self.condition = threading.Condition()
+        self.batches: deque[pa.RecordBatch] = deque()
+        self.nbytes = 0
+        self.error: str = None
+        self.closed = False
+
+    def offer(self, batch: pa.RecordBatch) -> bool:
+        with self.condition:
+            if self.closed or self.error is not None:
+                return False
+            # a single batch over the limit still goes through an empty buffer
+            if self.batches and self.nbytes + batch.nbytes > self.max_bytes:
+                self.fail(f"Subscriber fell more than {self.max_bytes} bytes behind")
+                return False
+            self.batches.append(batch)
+            self.nbytes += batch.nbytes
+            self.condition.notify_all()
+            return True
+
+    def fail(self, error: str):
+        with self.condition:
+            self.error = error
+            self.batches.clear()
+            self.nbytes = 0
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __iter__(self) -> Generator[pa.RecordBatch, None, None]:
+        """Buffered batches as they arrive, until closed or cut off."""
+        return self.poll()
+
+    def poll(
+        self, timeout: float = None
+    ) -> Generator[pa.RecordBatch | None, None, None]:
+        """Like iterating, with a None whenever ``timeout`` seconds pass idle.
+
+        The Nones give the reader a chance to notice it should stop waiting.
+        """
+        while True:
+            with self.condition:
+                if self.condition.wait_for(
+                    lambda: self.batches or self.closed or self.error is not None,
+                    timeout,
+                ):
+                    if self.error is not None:
+                        raise RuntimeError(self.error)
+                    if not self.batches:
+                        return
+                    batch = self.batches.popleft()
+                    self.nbytes -= batch.nbytes
+                else:
+                    batch = None
+            yield batch
+
+
+class Subscriptions:
+    """Fans batches committed by do_put out to the subscribers of a table."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.subscribers: dict[Hashable, set[Subscription]] = {}
+        self.published = 0
+        self.cut_off = 0
+
+    def subscribe(self, key: Hashable, schema: pa.Schema) -> Subscription:
+        subscription = Subscription(key, schema, self.max_bytes)
+        with self.lock:
+            self.subscribers.setdefault(key, set()).add(subscription)
+        logger.info(f"Subscription {subscription.id} to {key}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.key, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.subscribers.pop(subscription.key, None)
+        logger.info(f"Subscription {subscription.id} ended")
+
+    def publish(self, key: Hashable, data: pa.Table):
+        with self.lock:
+            subscribers = list(self.subscribers.get(key, ()))
+        for subscription in subscribers:
+            try:
+                # inserts match columns by position, so do subscribers
+                table = pa.Table.from_arrays(
+                    data.columns, names=subscription.schema.names
+                ).cast(subscription.schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError) as e:
+                subscription.fail(f"Can't convert committed data: {e}")
+            else:
+                for batch in table.to_batches():
+                    if not subscription.offer(batch):
+                        break
+            if subscription.error is not None:
+                with self.lock:
+                    self.cut_off += 1
+                self.unsubscribe(subscription)
+        with self.lock:
+            self.published += len(subscribers)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "subscribers": sum(len(s) for s in self.subscribers.values()),
+                "published": self.published,
+                "cut_off": self.cut_off,
+            }
+
+    def close(self):
+        with self.lock:
+            subscribers = [s for group in self.subscribers.values() for s in group]
+        for subscription in subscribers:
+            self.unsubscribe(subscription)
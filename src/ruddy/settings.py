@@ -23,5 +23,128 @@ class Settings(BaseSettings):
         default="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
 
+    # metrics
+    SLOW_QUERY_SECONDS: Optional[float] = Field(
+        description="Calls taking at least this long are logged as slow, None disables it",
+        default=None,
+    )
+
+    # backend
+    STREAMING: Optional[bool] = Field(
+        description="Whether to stream do_get results as record batches",
+        default=True,
+    )
+    BATCH_SIZE: Optional[int] = Field(
+        description="Number of rows per record batch when streaming results",
+        default=100_000,
+    )
+    COMPRESSION: Optional[str] = Field(
+        description="IPC compression of streamed results unless a call asks otherwise, lz4 or zstd",
+        default=None,
+    )
+    COMPRESSION_LEVEL: Optional[int] = Field(
+        description="Level of the default IPC compression codec",
+        default=None,
+    )
+    PUT_FLUSH_ROWS: Optional[int] = Field(
+        description="Number of buffered rows that triggers a commit during do_put",
+        default=1_000_000,
+    )
+    PUT_FLUSH_BYTES: Optional[int] = Field(
+        description="Number of buffered bytes that triggers a commit during do_put",
+        default=64 * 1024 * 1024,
+    )
+    COMPACT_TICKETS: Optional[bool] = Field(
+        description="Whether to issue binary tickets instead of json, both are accepted",
+        default=True,
+    )
+    PREPARED_STATEMENTS: Optional[int] = Field(
+        description="Number of prepared statements kept, per cursor and in total",
+        default=256,
+    )
+    PARTITION_ROWS: Optional[int] = Field(
+        description="Minimum number of rows per endpoint when splitting table scans",
+        default=1_000_000,
+    )
+    MAX_PARTITIONS: Optional[int] = Field(
+        description="Maximum number of endpoints a table scan is split into",
+        default=8,
+    )
+    POOL_SIZE: Optional[int] = Field(
+        description="Maximum number of DuckDB cursors in use at the same time",
+        default=8,
+    )
+    POOL_MAX_WAITING: Optional[int] = Field(
+        description="Maximum number of calls queued for a free cursor",
+        default=64,
+    )
+    POOL_TIMEOUT: Optional[float] = Field(
+        description="Seconds a call waits for a free cursor before failing",
+        default=30.0,
+    )
+    CATALOG_TTL: Optional[float] = Field(
+        description="Seconds before the cached catalog is reloaded, None to never expire",
+        default=60.0,
+    )
+    SCHEMA_CACHE_SIZE: Optional[int] = Field(
+        description="Number of query schemas kept for get_flight_info",
+        default=1024,
+    )
+    RESULT_CACHE_BYTES: Optional[int] = Field(
+        description="Memory available for cached do_get results, 0 disables the cache",
+        default=0,
+    )
+    RESULT_CACHE_ENTRY_BYTES: Optional[int] = Field(
+        description="Largest single result kept in the result cache",
+        default=64 * 1024 * 1024,
+    )
+
+    # databases
+    DATABASE_ROOT: Optional[str] = Field(
+        description="Directory of the databases requests may attach, only the primary if unset",
+        default=None,
+    )
+    MAX_ATTACHED_DATABASES: Optional[int] = Field(
+        description="Databases attached at a time, idle ones are detached beyond it",
+        default=64,
+    )
+    DATABASE_IDLE_SECONDS: Optional[float] = Field(
+        description="Seconds after which an unused attached database is detached",
+        default=300.0,
+    )
+
+    # files, it confines the import and export actions only, DuckDB's file
+    # functions in statements sent through do_get or jobs are not restricted
+    FILE_ROOT: Optional[str] = Field(
+        description="Directory server side imports and exports are confined to, disabled if unset",
+        default=None,
+    )
+
+    # snapshots
+    SNAPSHOT_DIR: Optional[str] = Field(
+        description="Directory for memory mapped arrow snapshots of hot tables",
+        default=None,
+    )
+    SNAPSHOT_TABLES: Optional[list[str]] = Field(
+        description="Tables served from snapshots, names or qualified names, * for all",
+        default=[],
+    )
+
+    # jobs
+    JOB_WORKERS: Optional[int] = Field(
+        description="Threads running background jobs submitted with do_action",
+        default=4,
+    )
+    JOB_HISTORY: Optional[int] = Field(
+        description="Finished jobs, and their results, kept for status and result calls",
+        default=100,
+    )
+
+    # subscriptions
+    SUBSCRIPTION_BUFFER_BYTES: Optional[int] = Field(
+        description="Committed data buffered per subscriber, slower subscribers are cut off",
+        default=64 * 1024 * 1024,
+    )
+
 
 settings = Settings()
@@ -41,6 +41,10 @@ class URL:
     def schema(self) -> str:
         return self.yurl.query.get("schema")
 
+    @property
+    def compression(self) -> str:
+        return self.yurl.query.get("compression")
+
     def to_dict(self) -> dict:
         return {
             "raw": self.raw,
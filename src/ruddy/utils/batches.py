@@ -0,0 +1,61 @@
+import itertools
+from typing import Iterable, Iterator
+
+import pyarrow as pa
+
+BatchSource = pa.Table | pa.RecordBatch | pa.RecordBatchReader | Iterable[pa.RecordBatch]
+
+
+def with_schema(
+    data: BatchSource, schema: pa.Schema = None
+) -> tuple[pa.Schema, Iterator[pa.RecordBatch]]:
+    """Normalize tables, readers and iterables to a schema and batch iterator."""
+    if isinstance(data, pa.Table):
+        return data.schema, iter(data.to_batches())
+    if isinstance(data, pa.RecordBatch):
+        return data.schema, iter([data])
+    if isinstance(data, pa.RecordBatchReader):
+        return data.schema, iter(data)
+
+    batches = iter(data)
+    if schema is None:
+        try:
+            first = next(batches)
+        except StopIteration:
+            raise ValueError("Schema is required for an empty batch iterable")
+        schema = first.schema
+        batches = itertools.chain([first], batches)
+    return schema, batches
+
+
+def combine(batches: list[pa.RecordBatch]) -> pa.RecordBatch:
+    if len(batches) == 1:
+        return batches[0]
+    return pa.Table.from_batches(batches).combine_chunks().to_batches()[0]
+
+
+def rechunk(
+    batches: Iterable[pa.RecordBatch], target_bytes: int
+) -> Iterator[pa.RecordBatch]:
+    """Slice large batches and merge small ones to roughly ``target_bytes`` each."""
+    pending, pending_bytes = [], 0
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        if batch.nbytes > target_bytes:
+            if pending:
+                yield combine(pending)
+                pending, pending_bytes = [], 0
+            rows = max(1, batch.num_rows * target_bytes // batch.nbytes)
+            for offset in range(0, batch.num_rows, rows):
+                yield batch.slice(offset, rows)
+            continue
+
+        pending.append(batch)
+        pending_bytes += batch.nbytes
+        if pending_bytes >= target_bytes:
+            yield combine(pending)
+            pending, pending_bytes = [], 0
+
+    if pending:
+        yield combine(pending)
@@ -0,0 +1,20 @@
+import pyarrow as pa
+
+CODECS = ("lz4", "zstd")
+
+
+def write_options(
+    compression: str = None, level: int = None
+) -> pa.ipc.IpcWriteOptions:
+    """IPC write options for a codec name, ``None`` or ``"none"`` disable it."""
+    if compression is None or compression.lower() == "none":
+        return pa.ipc.IpcWriteOptions()
+
+    compression = compression.lower()
+    if compression not in CODECS:
+        raise ValueError(
+            f"Unsupported compression '{compression}', expected one of {CODECS}"
+        )
+    if level is not None:
+        return pa.ipc.IpcWriteOptions(compression=pa.Codec(compression, level))
+    return pa.ipc.IpcWriteOptions(compression=compression)
@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    """Thread safe least recently used mapping.
+
+    Bounded by number of items and, when a ``weigher`` is given, by the total
+    weight of the values. Values heavier than ``max_weight`` are not stored.
+    """
+
+    def __init__(
+        self,
+        max_items: int = None,
+        max_weight: int = None,
+        weigher: Callable[[Any], int] = None,
+        on_evict: Callable[[Hashable, Any], None] = None,
+    ):
+        self.max_items = max_items
+        self.max_weight = max_weight
+        self.weigher = weigher or (lambda _: 1)
+        self.on_evict = on_evict
+        self.lock = threading.Lock()
+        self.items: OrderedDict[Hashable, Any] = OrderedDict()
+        self.weights: dict[Hashable, int] = {}
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.items
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like get, without touching recency or counters."""
+        with self.lock:
+            return self.items.get(key, default)
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        weight = self.weigher(value)
+        if self.max_items is not None and self.max_items <= 0:
+            return False
+        if self.max_weight is not None and weight > self.max_weight:
+            return False
+        with self.lock:
+            self.remove(key)
+            self.items[key] = value
+            self.weights[key] = weight
+            self.weight += weight
+            while (self.max_items is not None and len(self.items) > self.max_items) or (
+                self.max_weight is not None and self.weight > self.max_weight
+            ):
+                evicted = next(iter(self.items))
+                value = self.remove(evicted)
+                self.evictions += 1
+                if self.on_evict:
+                    self.on_evict(evicted, value)
+        return True
+
+    def remove(self, key: Hashable) -> Any:
+        # caller holds the lock
+        self.weight -= self.weights.pop(key, 0)
+        return self.items.pop(key, None)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            if key not in self.items:
+                return default
+            return self.remove(key)
+
+    def keys(self) -> list[Hashable]:
+        with self.lock:
+            return list(self.items)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.weights.clear()
+            self.weight = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "items": len(self.items),
+                "weight": self.weight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
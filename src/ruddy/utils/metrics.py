@@ -0,0 +1,104 @@
+import bisect
+import threading
+from typing import Iterable
+
+# seconds, from a fast metadata call to a long scan
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def format_labels(labels: Labels, extra: Labels = ()) -> str:
+    items = [*labels, *extra]
+    if not items:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread safe counters and histograms rendered in Prometheus text format.
+
+    Metrics are declared once with ``counter`` or ``histogram`` and then
+    updated by name with keyword labels.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.kinds: dict[str, tuple[str, str, tuple]] = {}
+        self.values: dict[str, dict[Labels, float | Histogram]] = {}
+
+    def counter(self, name: str, help: str):
+        self.kinds[name] = ("counter", help, ())
+        self.values.setdefault(name, {})
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = None):
+        self.kinds[name] = ("histogram", help, tuple(buckets or LATENCY_BUCKETS))
+        self.values.setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            if key not in series:
+                series[key] = Histogram(self.kinds[name][2])
+            series[key].observe(value)
+
+    def get(self, name: str, **labels) -> float | Histogram | None:
+        with self.lock:
+            return self.values[name].get(tuple(sorted(labels.items())))
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, (kind, help, _) in self.kinds.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in self.values[name].items():
+                    if kind == "counter":
+                        sample = f"{format_labels(labels)} {format_value(value)}"
+                        lines.append(f"{name}{sample}")
+                        continue
+                    cumulative = 0
+                    bounds = [*value.buckets, float("inf")]
+                    for bound, count in zip(bounds, value.counts):
+                        cumulative += count
+                        le = (("le", format_value(bound)),)
+                        lines.append(
+                            f"{name}_bucket{format_labels(labels, le)} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_sum{format_labels(labels)} {format_value(value.sum)}"
+                    )
+                    lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,63 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from ruddy.client.client import Client
+from ruddy.server.coordinator import Coordinator
+from ruddy.server.server import Server
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    server = Server(f"grpc://localhost:{free_port()}")
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    # the backend connects inside serve()
+    while server.backend.pool is None:
+        time.sleep(0.01)
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+def client(server: Server):
+    with Client(server.url) as client:
+        yield client
+
+
+@pytest.fixture
+def nodes():
+    servers = [Server(f"grpc://localhost:{free_port()}") for _ in range(3)]
+    threads = [threading.Thread(target=s.serve) for s in servers]
+    for thread in threads:
+        thread.start()
+    for server in servers:
+        while server.backend.pool is None:
+            time.sleep(0.01)
+    yield servers
+    for server, thread in zip(servers, threads):
+        server.shutdown()
+        thread.join()
+
+
+@pytest.fixture
+def coordinator(nodes: list[Server], tmp_path):
+    coordinator = Coordinator(
+        f"grpc://localhost:{free_port()}",
+        [node.url for node in nodes],
+        placements=str(tmp_path / "placements.json"),
+    )
+    thread = threading.Thread(target=coordinator.serve)
+    thread.start()
+    yield coordinator
+    coordinator.shutdown()
+    thread.join()
@@ -0,0 +1,26 @@
+import pyarrow as pa
+import pytest
+
+from ruddy.utils.batches import rechunk, with_schema
+
+
+def test_with_schema_peeks_iterables():
+    batch = pa.record_batch({"id": [1, 2]})
+    schema, batches = with_schema(b for b in [batch, batch])
+    assert schema == batch.schema
+    assert len(list(batches)) == 2
+
+
+def test_with_schema_empty_iterable():
+    with pytest.raises(ValueError):
+        with_schema([])
+
+
+def test_rechunk_slices_and_merges():
+    large = pa.record_batch({"id": list(range(1000))})
+    small = pa.record_batch({"id": [1]})
+    target = large.nbytes // 4
+    batches = list(rechunk([large] + [small] * 10, target))
+    assert sum(b.num_rows for b in batches) == 1010
+    assert all(b.nbytes <= target for b in batches[:4])
+    assert batches[-1].num_rows == 10
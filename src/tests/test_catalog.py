@@ -0,0 +1,52 @@
+import pyarrow as pa
+import pyarrow.flight as flight
+
+from ruddy.server.backend.catalog import CatalogCache
+
+
+class Loader:
+    def __init__(self, *tables: str):
+        self.tables = list(tables)
+        self.calls = []
+
+    def info(self, name: str) -> flight.FlightInfo:
+        descriptor = flight.FlightDescriptor.for_path("memory", "main", name)
+        return flight.FlightInfo(pa.schema([]), descriptor, [], -1, -1)
+
+    def __call__(self, key):
+        self.calls.append(key)
+        names = self.tables if key is None else [key[2]]
+        return [self.info(name) for name in names if name in self.tables]
+
+
+def test_catalog_loads_once():
+    loader = Loader("a", "b")
+    catalog = CatalogCache(loader, ttl=None)
+    assert len(catalog.list()) == 2
+    assert catalog.get(("memory", "main", "a")) is not None
+    assert loader.calls == [None]
+
+
+def test_catalog_refreshes_invalidated_entries_only():
+    loader = Loader("a")
+    catalog = CatalogCache(loader, ttl=None)
+    catalog.list()
+    loader.tables.append("b")
+    catalog.invalidate(("memory", "main", "b"))
+    assert len(catalog.list()) == 2
+    assert loader.calls == [None, ("memory", "main", "b")]
+
+
+def test_catalog_expires():
+    loader = Loader("a")
+    catalog = CatalogCache(loader, ttl=0)
+    catalog.list()
+    catalog.list()
+    assert loader.calls == [None, None]
+
+
+def test_catalog_miss_is_looked_up():
+    loader = Loader("a")
+    catalog = CatalogCache(loader, ttl=None)
+    assert catalog.get(("memory", "main", "missing")) is None
+    assert loader.calls == [None, ("memory", "main", "missing")]
@@ -0,0 +1,102 @@
+import json
+
+import pyarrow as pa
+import pyarrow.flight as flight
+import pytest
+
+from ruddy.client.client import Client
+from ruddy.server.coordinator import Coordinator
+from ruddy.server.server import Server
+
+
+def test_shards_tables_across_nodes(coordinator: Coordinator, nodes: list[Server]):
+    data = pa.table({"id": list(range(1000)), "value": [i * 2 for i in range(1000)]})
+    with Client(coordinator.url) as client:
+        client.place("items", "value")
+        client.do_put("items", data)
+
+        assert client.read_table("items").sort_by("id").equals(data)
+        # every node holds a shard and was read from directly
+        assert len(client.nodes) == len(nodes)
+        for node in nodes:
+            (count,) = node.backend.execute("select count(*) from items")[0]
+            assert 0 < count.as_py() < 1000
+
+        rows = client.read_query("select id, value + 1 as v from items where id < 10")
+        assert sorted(rows["id"].to_pylist()) == list(range(10))
+        filtered = client.read_table("items", filters=[("id", "<", 10)])
+        assert sorted(filtered["id"].to_pylist()) == list(range(10))
+
+    with open(coordinator.placements.path) as f:
+        (placement,) = json.load(f)
+    assert placement["shard_key"] == "value"
+    assert placement["nodes"] == [node.url.location for node in nodes]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "select count(*) from items",
+        "select id from items order by id limit 3",
+        "select distinct id from items",
+        "select sum(id) over () from items",
+        "select id from items group by id",
+        "select * from items where id in (select id from items)",
+        "delete from items",
+    ],
+)
+def test_rejects_queries_that_are_not_row_wise(coordinator: Coordinator, query):
+    with Client(coordinator.url) as client:
+        with pytest.raises(pa.ArrowInvalid, match="coordinator only runs"):
+            client.read_query(query)
+
+
+def test_queries_fewer_rows_than_nodes(coordinator: Coordinator, nodes: list[Server]):
+    with Client(coordinator.url) as client:
+        with pytest.raises(pa.ArrowInvalid, match="isn't placed"):
+            client.read_query("select * from small")
+        client.place("small", "id")
+        client.do_put("small", pa.table({"id": [1]}))
+        # only one node holds a shard, the others have no such table
+        assert client.read_query("select * from small").to_pydict() == {"id": [1]}
+        assert client.read_query("select * from small where id > 100").num_rows == 0
+
+
+def test_read_table_since_is_rejected(coordinator: Coordinator):
+    with Client(coordinator.url) as client:
+        client.place("events", "id")
+        client.do_put("events", pa.table({"id": list(range(10))}))
+        with pytest.raises(ValueError, match="needs a single server"):
+            client.read_table_since("events")
+
+
+def test_put_requires_a_placement(coordinator: Coordinator):
+    with Client(coordinator.url) as client:
+        with pytest.raises(flight.FlightServerError, match="place it with a shard key"):
+            client.do_put("items", pa.table({"id": [1]}))
+        client.place("items", "key")
+        with pytest.raises(flight.FlightServerError, match="Shard key key is missing"):
+            client.do_put("items", pa.table({"id": [1]}))
+
+
+def test_unavailable_node_fails_reads(coordinator: Coordinator, nodes: list[Server]):
+    with Client(coordinator.url) as client:
+        client.place("items", "id")
+        client.do_put("items", pa.table({"id": list(range(100))}))
+        nodes[0].shutdown()
+        with pytest.raises(flight.FlightUnavailableError):
+            client.read_table("items")
+
+
+def test_put_buffers_batches_per_flush(coordinator: Coordinator, nodes: list[Server]):
+    data = pa.table({"id": list(range(10_000))})
+    with Client(coordinator.url) as client:
+        client.place("items", "id")
+        # ten batches, one commit per node
+        client.do_put("items", data.to_batches(max_chunksize=1000), batch_bytes=8000)
+        assert client.read_table("items").num_rows == 10_000
+    for node in nodes:
+        puts = node.metrics.metrics.get(
+            "ruddy_rpc_calls_total", method="do_put", status="ok"
+        )
+        assert puts == 1
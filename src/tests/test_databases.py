@@ -0,0 +1,45 @@
+import duckdb
+import pytest
+
+from ruddy.server.backend.databases import Databases
+
+
+def attached(conn: duckdb.DuckDBPyConnection) -> set[str]:
+    rows = conn.execute("select database_name from duckdb_databases()").fetchall()
+    return {name for (name,) in rows}
+
+
+def test_leased_databases_are_not_detached_when_idle(tmp_path):
+    conn = duckdb.connect()
+    databases = Databases(":memory:", root=str(tmp_path), idle_timeout=0)
+    assert databases.lease(conn, None) == "memory"
+
+    alias = databases.lease(conn, "tenant")
+    assert alias == "tenant" and "tenant" in attached(conn)
+    databases.close_idle(conn)
+    assert "tenant" in attached(conn)
+
+    databases.release(alias)
+    databases.close_idle(conn)
+    assert "tenant" not in attached(conn)
+
+
+def test_only_databases_under_the_root_attach(tmp_path):
+    conn = duckdb.connect()
+    with pytest.raises(PermissionError, match="DATABASE_ROOT"):
+        Databases(":memory:").lease(conn, "tenant")
+
+    databases = Databases(":memory:", root=str(tmp_path))
+    # would be routed to the primary, and detached with it later
+    with pytest.raises(ValueError, match="catalog that is in use"):
+        databases.lease(conn, "memory")
+    assert databases.stats()["attached"] == 0
+
+
+def test_failed_detach_drops_the_database(tmp_path):
+    conn = duckdb.connect()
+    databases = Databases(":memory:", root=str(tmp_path), idle_timeout=0)
+    databases.release(databases.lease(conn, "tenant"))
+    conn.execute("USE tenant")
+    databases.close_idle(conn)
+    assert databases.stats()["attached"] == 0
@@ -0,0 +1,21 @@
+from ruddy.utils.lru import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.keys() == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_bounded_by_weight():
+    cache = LRUCache(max_weight=10, weigher=len)
+    assert cache.put("a", "x" * 6)
+    assert cache.put("b", "x" * 4)
+    assert cache.put("c", "x" * 3)
+    assert cache.keys() == ["b", "c"]
+    assert cache.stats()["weight"] == 7
+    assert not cache.put("d", "x" * 11)
@@ -0,0 +1,24 @@
+from ruddy.utils.metrics import Metrics
+
+
+def test_render_prometheus_text():
+    metrics = Metrics()
+    metrics.counter("calls_total", "Calls.")
+    metrics.histogram("latency_seconds", "Latency.", buckets=[0.1, 1.0])
+    metrics.inc("calls_total", method="do_get")
+    metrics.inc("calls_total", 2, method="do_get")
+    metrics.observe("latency_seconds", 0.5, method='a"b')
+    metrics.observe("latency_seconds", 5, method='a"b')
+
+    assert metrics.render().splitlines() == [
+        "# HELP calls_total Calls.",
+        "# TYPE calls_total counter",
+        'calls_total{method="do_get"} 3',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{method="a\\"b",le="0.1"} 0',
+        'latency_seconds_bucket{method="a\\"b",le="1.0"} 1',
+        'latency_seconds_bucket{method="a\\"b",le="+Inf"} 2',
+        'latency_seconds_sum{method="a\\"b"} 5.5',
+        'latency_seconds_count{method="a\\"b"} 2',
+    ]
@@ -0,0 +1,52 @@
+import threading
+
+import duckdb
+import pyarrow.flight as flight
+import pytest
+
+from ruddy.server.backend.pool import CursorPool
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect()
+    yield conn
+    conn.close()
+
+
+def test_pool_reuses_cursors(conn):
+    pool = CursorPool(conn.cursor, max_size=2, max_waiting=0)
+    with pool.cursor() as first:
+        pass
+    with pool.cursor() as second:
+        assert second is first
+    assert pool.stats()["acquired"] == 2
+    assert pool.stats()["idle"] == 1
+
+
+def test_pool_rejects_when_queue_is_full(conn):
+    pool = CursorPool(conn.cursor, max_size=1, max_waiting=0)
+    with pool.cursor():
+        with pytest.raises(flight.FlightUnavailableError):
+            pool.acquire()
+    assert pool.stats()["rejected"] == 1
+
+
+def test_pool_times_out_waiting(conn):
+    pool = CursorPool(conn.cursor, max_size=1, max_waiting=1, timeout=0.05)
+    with pool.cursor():
+        with pytest.raises(flight.FlightTimedOutError):
+            pool.acquire()
+
+
+def test_pool_hands_cursor_to_waiter(conn):
+    pool = CursorPool(conn.cursor, max_size=1, max_waiting=1, timeout=5)
+    cursor = pool.acquire()
+    waiter = threading.Thread(target=lambda: pool.release(pool.acquire()))
+    waiter.start()
+    while pool.stats()["waiting"] == 0:
+        pass
+    pool.release(cursor)
+    waiter.join()
+    assert pool.stats()["in_use"] == 0
+    assert pool.stats()["acquired"] == 2
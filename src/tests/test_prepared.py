@@ -0,0 +1,41 @@
+import datetime
+import decimal
+
+import duckdb
+import pytest
+
+from ruddy.server.backend.prepared import PreparedStatements, sql_literal
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        True,
+        42,
+        1.5,
+        float("inf"),
+        decimal.Decimal("1.25"),
+        decimal.Decimal("1.2345"),
+        decimal.Decimal("-0.000001"),
+        decimal.Decimal("12345678901234567890.5"),
+        decimal.Decimal("1E+20"),
+        "it's",
+        b"\x00\xff'",
+        datetime.datetime(2024, 1, 1, 10, 30),
+        datetime.date(2024, 1, 2),
+        datetime.time(10, 30),
+    ],
+)
+def test_sql_literal_round_trips(value):
+    (result,) = duckdb.execute(f"select {sql_literal(value)}").fetchone()
+    assert result == value
+
+
+def test_statements_are_deallocated_on_eviction():
+    conn = duckdb.connect()
+    prepared = PreparedStatements(max_statements=1)
+    first = prepared.prepare(conn, "select 1")
+    prepared.prepare(conn, "select 2")
+    with pytest.raises(duckdb.Error):
+        conn.execute(f"EXECUTE {prepared.name(first)}")
@@ -0,0 +1,576 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.flight as flight
+import pyarrow.parquet as pq
+import pytest
+
+from ruddy.client.cache import LocalCache
+from ruddy.client.client import Client
+from ruddy.models.ticket_wrapper import TicketWrapper
+from ruddy.server.backend.result_cache import ResultCache
+from ruddy.server.backend.snapshots import SnapshotStore
+from ruddy.server.server import Server
+from ruddy.settings import settings
+
+
+def test_do_put_and_read_table(client: Client):
+    data = pa.table({"id": [1, 2, 3], "name": ["a", "b", "c"]})
+    client.do_put("items", data)
+    assert client.read_table("items").to_pydict() == data.to_pydict()
+
+
+def test_do_get_streams_batches(server: Server, client: Client):
+    server.backend.config["batch_size"] = 1000
+    ticket = TicketWrapper.ticket_from_command("select range id from range(10000)")
+    reader = client.client.do_get(ticket)
+    batches = [chunk.data for chunk in reader]
+    assert len(batches) == 10
+    assert sum(b.num_rows for b in batches) == 10000
+
+
+def test_do_get_materialized(server: Server, client: Client):
+    server.backend.config["streaming"] = False
+    ticket = TicketWrapper.ticket_from_command("select range id from range(10000)")
+    table = client.client.do_get(ticket).read_all()
+    assert table.num_rows == 10000
+
+
+def test_do_put_commits_in_micro_batches(client: Client, monkeypatch):
+    monkeypatch.setattr(settings, "PUT_FLUSH_ROWS", 100)
+    data = pa.Table.from_batches(
+        pa.table({"id": list(range(1000))}).to_batches(max_chunksize=50)
+    )
+    progress = client.do_put("numbers", data)
+    assert progress.rows == 1000
+    assert progress.nbytes == data.nbytes
+    assert client.read_table("numbers").num_rows == 1000
+
+
+def test_pool_stats_action(client: Client):
+    client.do_put("items", pa.table({"id": [1]}))
+    client.read_table("items")
+    (result,) = client.client.do_action(flight.Action("pool-stats", b""))
+    stats = json.loads(result.body.to_pybytes())
+    assert stats["in_use"] == 0
+    assert stats["acquired"] >= 1
+
+
+def test_list_flights(client: Client):
+    client.do_put("first", pa.table({"id": [1]}))
+    client.do_put("second", pa.table({"name": ["a"], "value": [1.0]}))
+    infos = {info.descriptor.path[-1]: info for info in client.list_flights()}
+    assert infos[b"first"].schema.names == ["id"]
+    assert infos[b"first"].total_records == 1
+    assert infos[b"second"].schema.names == ["name", "value"]
+
+
+def test_statements_through_do_get_refresh_the_catalog(client: Client):
+    assert not list(client.list_flights())
+    create = TicketWrapper.ticket_from_command("create table created as select 1 x")
+    client.client.do_get(create).read_all()
+    assert client.read_table("created").to_pydict() == {"x": [1]}
+    drop = TicketWrapper.ticket_from_command("drop table created")
+    client.client.do_get(drop).read_all()
+    assert not list(client.list_flights())
+
+
+def test_catalog_filters_are_bound(client: Client):
+    client.do_put("items", pa.table({"id": [1]}))
+    with pytest.raises(pa.ArrowInvalid, match="Couldn't find any dataset"):
+        client.read_table("x' or '1'='1")
+
+
+def test_read_query(client: Client):
+    client.do_put("items", pa.table({"id": [1, 2, 3]}))
+    info = client.get_flight_info_for_command("select id, [id] ids from items")
+    assert info.schema == pa.schema([("id", pa.int64()), ("ids", pa.list_(pa.int64()))])
+    table = client.read_query("select id from items where id > 1")
+    assert table.to_pydict() == {"id": [2, 3]}
+
+
+def test_query_schema_is_cached(server: Server, client: Client):
+    query = "select range id from range(10)"
+    client.get_flight_info_for_command(query)
+    client.get_flight_info_for_command(query)
+    assert server.backend.schemas.stats()["hits"] == 1
+
+
+def test_read_query_ddl(client: Client):
+    client.read_query("create table created as select 1 id")
+    assert client.read_table("created").to_pydict() == {"id": [1]}
+
+
+def test_result_cache(server: Server, client: Client):
+    server.backend.results = ResultCache(max_bytes=1024 * 1024)
+    client.do_put("items", pa.table({"id": [1, 2, 3]}))
+    query = "select sum(id) total from items"
+    assert client.read_query(query).to_pydict() == {"total": [6]}
+    assert client.read_query(query).to_pydict() == {"total": [6]}
+    client.do_put("items", pa.table({"id": [4]}))
+    assert client.read_query(query).to_pydict() == {"total": [10]}
+
+    (result,) = client.client.do_action(flight.Action("cache-stats", b""))
+    stats = json.loads(result.body.to_pybytes())["results"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["invalidations"] == 1
+
+
+def test_partitioned_table_scan(server: Server, client: Client):
+    server.backend.config.update(partition_rows=100, max_partitions=4)
+    data = pa.table({"id": list(range(1000))})
+    client.do_put("numbers", data)
+
+    info = client.get_flight_info_for_table("numbers")
+    assert len(info.endpoints) == 4
+    tickets = [TicketWrapper.deserialize(e.ticket.ticket) for e in info.endpoints]
+    assert [t.partition for t in tickets] == [
+        (0, 250),
+        (250, 500),
+        (500, 750),
+        (750, None),
+    ]
+
+    assert client.read_table("numbers").sort_by("id").equals(data)
+    assert client.table_reader("numbers").read_all().num_rows == 1000
+
+
+def test_read_many(server: Server, client: Client):
+    server.backend.config.update(partition_rows=10, max_partitions=4)
+    for name in ("a", "b", "c"):
+        client.do_put(name, pa.table({"id": list(range(100))}))
+
+    tables = client.read_tables(["a", "b", "c"])
+    assert {name: t.num_rows for name, t in tables.items()} == {"a": 100, "b": 100, "c": 100}
+
+    queries = [f"select count(*) n from {name}" for name in ("a", "b", "c")]
+    assert [t["n"][0].as_py() for t in client.read_queries(queries)] == [100] * 3
+
+
+def test_read_async(client: Client):
+    client.do_put("items", pa.table({"id": [1, 2]}))
+
+    async def main():
+        return await asyncio.gather(
+            client.read_table_async("items"),
+            client.read_query_async("select 1 one"),
+        )
+
+    table, one = asyncio.run(main())
+    assert table.num_rows == 2
+    assert one.to_pydict() == {"one": [1]}
+
+
+def test_gather_no_endpoints(client: Client):
+    schema = pa.schema([("id", pa.int64())])
+    table = client.gather_endpoints([], schema).result(timeout=5)
+    assert table.schema == schema and table.num_rows == 0
+
+
+def test_do_put_parallel_streams(client: Client, monkeypatch):
+    monkeypatch.setattr(settings, "PUT_FLUSH_ROWS", 100)
+    data = pa.table({"id": list(range(10_000))})
+    updates = []
+    progress = client.do_put(
+        "numbers",
+        data.to_reader(),
+        batch_bytes=data.nbytes // 20,
+        streams=4,
+        max_unacked_bytes=data.nbytes,
+        on_progress=updates.append,
+    )
+    assert progress.rows == 10_000
+    assert updates[-1].rows == 10_000
+    assert [u.rows for u in updates] == sorted(u.rows for u in updates)
+    assert client.read_table("numbers").sort_by("id").equals(data)
+
+
+def test_do_put_window_below_flush_thresholds(client: Client):
+    # the default thresholds alone would never commit within the window
+    data = pa.table({"id": list(range(1000))})
+    updates = []
+    progress = client.do_put(
+        "numbers",
+        data,
+        batch_bytes=data.nbytes // 10,
+        max_unacked_bytes=data.nbytes // 4,
+        on_progress=updates.append,
+    )
+    assert progress.rows == 1000
+    assert len(updates) > 1
+
+
+def test_read_table_pushdown(server: Server, client: Client):
+    server.backend.config.update(partition_rows=10, max_partitions=4)
+    client.do_put(
+        "items",
+        pa.table({"id": list(range(100)), "name": [f"item-{i}" for i in range(100)]}),
+    )
+    table = client.read_table(
+        "items", columns=["name"], filters=[("id", ">=", 90), ("id", "in", [91, 95, 99])]
+    )
+    assert table.to_pydict() == {"name": ["item-91", "item-95", "item-99"]}
+    assert client.read_table("items", limit=5).num_rows == 5
+
+    injection = [("id", "=", "1 or 1=1")]
+    with pytest.raises(flight.FlightServerError):
+        client.read_table("items", filters=injection)
+
+
+@pytest.mark.parametrize("compression", ["lz4", "zstd", "none"])
+def test_compression(server: Server, compression: str):
+    server.backend.config["compression"] = "zstd"
+    data = pa.table({"id": list(range(1000)), "name": ["same"] * 1000})
+    with Client(f"{server.url}?compression={compression}") as client:
+        client.do_put("items", data)
+        assert client.read_table("items").equals(data)
+
+
+def test_prepared_statement(server: Server, client: Client):
+    client.do_put("items", pa.table({"id": [1, 2, 3], "name": ["a", "b", "c"]}))
+    with client.prepare("select name from items where id = $1 or name = $2") as stmt:
+        assert stmt.execute([1, "c"]).to_pydict() == {"name": ["a", "c"]}
+        assert stmt.execute({"id": [2, 3], "name": ["x", "x"]}).num_rows == 2
+
+        server.backend.prepared.close(stmt.handle)
+        assert stmt.execute((3, "it's")).to_pydict() == {"name": ["c"]}
+
+        with pytest.raises(pa.ArrowInvalid, match="no rows"):
+            stmt.execute(pa.table({"id": [1], "name": ["a"]}).slice(0, 0))
+
+    with pytest.raises(pa.ArrowInvalid, match="Only a single SELECT"):
+        client.prepare("delete from items")
+
+
+def test_jobs(server: Server, client: Client):
+    job_id = client.submit_job(
+        "create table squares as select range * range as sq from range(5)"
+    )
+    assert client.wait_job(job_id, timeout=10)["state"] == "done"
+    table = client.read_query("select sum(sq) as total from squares")
+    assert table.to_pydict() == {"total": [30]}
+
+    job_id = client.submit_job("select range as id from range(3)")
+    assert client.wait_job(job_id, timeout=10)["rows"] == 3
+    assert client.job_result(job_id).column("id").to_pylist() == [0, 1, 2]
+
+    job_id = client.submit_job("select count(*) from range(10000000000), range(10)")
+    client.cancel_job(job_id)
+    assert client.wait_job(job_id, timeout=10)["state"] == "cancelled"
+    with pytest.raises(pa.ArrowInvalid):
+        client.job_result(job_id)
+
+    job_id = client.submit_job("select * from missing")
+    status = client.wait_job(job_id, timeout=10)
+    assert status["state"] == "failed" and "missing" in status["error"]
+
+
+def test_import_export_files(server: Server, client: Client, tmp_path):
+    pq.write_table(pa.table({"id": [1, 2], "kind": ["a", "b"]}), tmp_path / "1.parquet")
+    pq.write_table(pa.table({"id": [3], "kind": ["a"]}), tmp_path / "2.parquet")
+    feather.write_feather(pa.table({"id": [4], "kind": ["b"]}), tmp_path / "3.arrow")
+    (tmp_path / "4.csv").write_text("id;kind\n5;a\n")
+
+    with pytest.raises(flight.FlightServerError, match="FILE_ROOT isn't set"):
+        client.import_files("items", str(tmp_path / "1.parquet"))
+    with pytest.raises(flight.FlightServerError, match="FILE_ROOT isn't set"):
+        client.export_query("select 1", str(tmp_path / "out"), background=True)
+    server.backend.config["file_root"] = str(tmp_path)
+
+    assert client.import_files("items", str(tmp_path / "*.parquet")) == 3
+    assert client.import_files("items", str(tmp_path / "3.arrow")) == 1
+    csv = str(tmp_path / "4.csv")
+    assert client.import_files("items", csv, options={"delim": ";"}) == 1
+    assert client.read_table("items").num_rows == 5
+    assert client.import_files("arrows", str(tmp_path / "*.arrow")) == 1
+    with pytest.raises(flight.FlightError, match="No file matches"):
+        client.import_files("arrows", str(tmp_path / "*.feather"), format="ipc")
+
+    out = str(tmp_path / "out")
+    job_id = client.export_query(
+        "select * from items", out, partition_by=["kind"], background=True
+    )
+    assert client.wait_job(job_id, timeout=10)["state"] == "done"
+    assert client.job_result(job_id).to_pydict() == {"rows": [5]}
+    assert sorted(os.listdir(tmp_path / "out")) == ["kind=a", "kind=b"]
+
+    parts = os.path.join(out, "*", "*.parquet")
+    assert client.import_files("copy", parts, mode="replace") == 5
+
+    server.backend.config["file_root"] = out
+    with pytest.raises(flight.FlightError, match="outside of the file root"):
+        client.import_files("items", str(tmp_path / "1.parquet"))
+    os.symlink(tmp_path / "1.parquet", os.path.join(out, "link.parquet"))
+    with pytest.raises(flight.FlightError, match="outside of the file root"):
+        client.import_files("items", os.path.join(out, "link.parquet"))
+
+
+def test_snapshots(server: Server, client: Client, tmp_path):
+    server.backend.snapshots = SnapshotStore(str(tmp_path), ["items"])
+    server.backend.config.update(partition_rows=40, max_partitions=4)
+    client.do_put("items", pa.table({"id": range(100), "name": ["x"] * 100}))
+    assert len(os.listdir(tmp_path)) == 1
+
+    assert client.read_table("items").column("id").to_pylist() == list(range(100))
+    assert client.read_table("items", columns=["name"]).column_names == ["name"]
+    assert client.read_table("items", limit=5).num_rows == 5
+    # each of the three partitions is a slice of the same snapshot
+    assert server.backend.snapshots.stats()["hits"] == 9
+
+    client.do_put("items", pa.table({"id": [100], "name": ["y"]}))
+    assert client.read_table("items").num_rows == 101
+    stats = server.backend.snapshots.stats()
+    assert stats["builds"] == 2 and stats["invalidations"] == 1
+
+    client.read_query("delete from items where id < 50")
+    assert server.backend.snapshots.stats()["snapshots"] == 0
+    table = client.read_table("items")
+    assert table.column("id").to_pylist() == list(range(50, 101))
+
+
+def test_metrics(server: Server, client: Client, caplog):
+    server.metrics.slow_query_seconds = 0
+    client.do_put("items", pa.table({"id": range(10)}))
+    with caplog.at_level("WARNING"):
+        assert client.read_query("select * from items").num_rows == 10
+        # do_get is recorded once its stream completes, after the client read it
+        text = client.server_metrics()
+    assert "Slow do_get" in caplog.text and "select * from items" in caplog.text
+    assert 'ruddy_rpc_calls_total{method="do_get",status="ok"} 1' in text
+    assert 'ruddy_query_seconds_count{method="do_get"} 1' in text
+
+    metrics = server.metrics.metrics
+    assert metrics.get("ruddy_rows_received_total", method="do_put") == 10
+    assert metrics.get("ruddy_rows_sent_total", method="do_get") == 10
+    for phase in ("execution", "streaming"):
+        histogram = metrics.get("ruddy_rpc_phase_seconds", method="do_get", phase=phase)
+        assert histogram.count == 1
+    assert metrics.get(
+        "ruddy_rpc_phase_seconds", method="get_flight_info", phase="metadata"
+    )
+
+    client_metrics = client.metrics_middleware.metrics
+    assert client_metrics.get("ruddy_client_rows_received_total", method="do_get") == 10
+    assert client_metrics.get("ruddy_client_calls_total", method="do_action", status="ok")
+
+
+def test_flight_info_schema_matches_do_get(server: Server, client: Client):
+    client.read_query(
+        """create table typed as select
+            {'x y': 1, 'b': ['a']} as s,
+            map(['k'], [1]) as m,
+            1::hugeint as h,
+            interval 1 day as i,
+            uuid() as u,
+            now() as tz,
+            1.5::decimal(10, 2) as d,
+            [1.0, 2.0, 3.0]::float[3] as f"""
+    )
+    info = client.get_flight_info_for_table("typed")
+    table = client.read_table("typed")
+    assert info.schema == table.schema
+    assert info.schema.field("d").type == pa.decimal128(10, 2)
+
+
+def test_routes_requests_to_attached_databases(server: Server, tmp_path):
+    databases = server.backend.databases
+    databases.root = str(tmp_path)
+    databases.max_attached = 1
+    location = server.url.location
+
+    for tenant, rows in (("tenant_a", 3), ("tenant_b", 5)):
+        with Client(f"{location}?database={tenant}") as client:
+            client.do_put("items", pa.table({"id": range(rows)}))
+            assert client.read_table("items").num_rows == rows
+            table = client.read_query("select count(*) as n from items")
+            assert table.to_pydict() == {"n": [rows]}
+
+    # tenant_a was detached to make room for tenant_b, it is attached again
+    assert databases.stats()["detaches"] == 1
+    assert {"tenant_a.duckdb", "tenant_b.duckdb"} <= set(os.listdir(tmp_path))
+    with Client(f"{location}?database=tenant_a") as client:
+        assert client.read_table("items").num_rows == 3
+        # tables of the other tenants and of the primary are not listed
+        server.backend.execute("create table primary_only as select 1 x")
+        (info,) = client.list_flights()
+        assert info.descriptor.path == [b"tenant_a", b"main", b"items"]
+    with Client(location) as client:
+        assert [i.descriptor.path[-1] for i in client.list_flights()] == [
+            b"primary_only"
+        ]
+
+    with Client(f"{location}?database=../outside") as client:
+        with pytest.raises(flight.FlightError, match="outside of the file root"):
+            client.read_query("select 1")
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_client_cache_revalidates(server: Server, tmp_path, on_disk):
+    cache = LocalCache(directory=str(tmp_path) if on_disk else None)
+    with Client(server.url, cache=cache) as client:
+        client.do_put("items", pa.table({"id": [1, 2]}))
+        client.read_query("create table other as select 1 as x")
+        query = "select sum(id) as total from items"
+
+        assert client.read_query(query).to_pydict() == {"total": [3]}
+        assert client.read_table("items").num_rows == 2
+        assert client.read_query(query).to_pydict() == {"total": [3]}
+        assert client.read_table("items").num_rows == 2
+        assert cache.stats()["hits"] == 2
+
+        # writes to other tables keep the entries valid
+        client.do_put("other", pa.table({"x": [2]}))
+        assert client.read_table("items").num_rows == 2
+        assert cache.stats()["revalidations"] == 0
+
+        client.do_put("items", pa.table({"id": [3]}))
+        assert client.read_query(query).to_pydict() == {"total": [6]}
+        assert client.read_table("items").num_rows == 3
+        assert cache.stats()["revalidations"] == 2
+
+        # pushed down reads keep the version token
+        misses = cache.stats()["misses"]
+        for _ in range(2):
+            assert client.read_table("items", columns=["id"], limit=1).num_rows == 1
+        assert cache.stats()["misses"] == misses + 1
+
+    if on_disk:
+        # a new cache over the same directory finds the entries again
+        assert len(LocalCache(directory=str(tmp_path)).entries) == 3
+
+
+def test_read_table_since(server: Server):
+    with Client(server.url) as client:
+        client.do_put("events", pa.table({"id": [1, 2]}))
+        table, watermark = client.read_table_since("events")
+        assert table["id"].to_pylist() == [1, 2]
+
+        table, watermark = client.read_table_since("events", watermark)
+        assert table.num_rows == 0
+
+        client.do_put("events", pa.table({"id": [3]}))
+        client.do_put("events", pa.table({"id": [4, 5]}))
+        table, watermark = client.read_table_since("events", watermark)
+        assert table["id"].to_pylist() == [3, 4, 5]
+
+        # a delete starts a new lineage, the next read is a full one
+        client.read_query("delete from events where id < 3")
+        table, watermark = client.read_table_since("events", watermark)
+        assert sorted(table["id"].to_pylist()) == [3, 4, 5]
+
+        client.do_put("events", pa.table({"id": [6]}))
+        table, _ = client.read_table_since("events", watermark)
+        assert table["id"].to_pylist() == [6]
+
+        # statements on other tables keep the lineage
+        client.read_query("create table unrelated as select 1 as x")
+        client.read_query("delete from unrelated")
+        client.do_put("events", pa.table({"id": [7]}))
+        table, _ = client.read_table_since("events", watermark)
+        assert table["id"].to_pylist() == [6, 7]
+
+
+def test_read_table_since_per_database(server: Server, tmp_path):
+    server.backend.databases.root = str(tmp_path)
+    location = server.url.location
+    with (
+        Client(f"{location}?database=tenant_a") as a,
+        Client(f"{location}?database=tenant_b") as b,
+    ):
+        a.do_put("events", pa.table({"id": list(range(10))}))
+        b.do_put("events", pa.table({"id": [0, 1]}))
+        table, watermark = b.read_table_since("events")
+        assert table.num_rows == 2
+
+        a.do_put("events", pa.table({"id": [10]}))
+        b.do_put("events", pa.table({"id": [2]}))
+        table, watermark = b.read_table_since("events", watermark)
+        assert table["id"].to_pylist() == [2]
+
+def test_subscribe_receives_committed_batches(server: Server):
+    with Client(server.url) as client:
+        client.do_put("live", pa.table({"id": [0]}))
+        subscription = client.subscribe("live")
+        received = []
+
+        def consume():
+            for batch in subscription:
+                received.extend(batch["id"].to_pylist())
+                if len(received) == 3:
+                    break
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        while server.subscriptions.stats()["subscribers"] == 0:
+            time.sleep(0.01)
+        client.do_put("live", pa.table({"id": [1, 2]}))
+        client.do_put("live", pa.table({"id": [3]}))
+        consumer.join(timeout=10)
+        assert received == [1, 2, 3]
+
+        # the idle server side stream notices the reader went away
+        subscription.close()
+        deadline = time.monotonic() + 5
+        while server.subscriptions.stats()["subscribers"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+
+def test_exchange_transforms_uploaded_batches(server: Server):
+    with Client(server.url) as client:
+        client.do_put("names", pa.table({"id": [1, 2], "name": ["a", "b"]}))
+        ids = pa.table({"id": list(range(100_000))})
+        result = client.exchange(
+            "select i.id, n.name from input i join names n using (id) order by i.id",
+            ids.to_batches(max_chunksize=10_000),
+        )
+        assert result.to_pydict() == {"id": [1, 2], "name": ["a", "b"]}
+
+        total = client.exchange("select sum(id) as total from input", ids)
+        assert total.to_pydict() == {"total": [sum(range(100_000))]}
+
+        with pytest.raises(flight.FlightError):
+            client.exchange("select missing from input", ids)
+
+
+def test_prepared_statements_are_routed(server: Server, tmp_path):
+    server.backend.databases.root = str(tmp_path)
+    location = server.url.location
+    for tenant, rows in (("tenant_a", 3), ("tenant_b", 5)):
+        with Client(f"{location}?database={tenant}") as client:
+            client.do_put("items", pa.table({"id": range(rows)}))
+            with client.prepare("select count(*) as n from items") as stmt:
+                assert stmt.execute().to_pydict() == {"n": [rows]}
+
+
+def test_every_advertised_action_is_handled(client: Client):
+    for action_type, _ in client.client.list_actions():
+        try:
+            client.do_action(action_type)
+        except flight.FlightError as e:
+            assert "Unknown action" not in str(e)
+        except pa.ArrowException:
+            # handled, only the empty body is rejected
+            pass
+
+
+def test_snapshots_of_empty_and_oddly_named_tables(
+    server: Server, client: Client, tmp_path
+):
+    server.backend.snapshots = SnapshotStore(str(tmp_path / "snapshots"), ["*"])
+    server.backend.execute('create table "a/b:c" (id int)')
+    server.backend.execute("create table empty (id int)")
+
+    for _ in range(3):
+        assert client.read_table("empty").num_rows == 0
+    assert server.backend.snapshots.stats()["builds"] == 1
+
+    assert client.read_table("a/b:c").num_rows == 0
+    files = os.listdir(tmp_path / "snapshots")
+    assert len(files) == 2 and not any(":" in f for f in files)
@@ -0,0 +1,55 @@
+import threading
+
+import pyarrow as pa
+import pytest
+
+from ruddy.server.subscriptions import Subscriptions
+
+
+def test_publish_reaches_subscribers_of_the_table():
+    subscriptions = Subscriptions(max_bytes=1024 * 1024)
+    schema = pa.schema([("id", pa.int64())])
+    subscription = subscriptions.subscribe("items", schema)
+    other = subscriptions.subscribe("other", schema)
+
+    subscriptions.publish("items", pa.table({"x": pa.array([1, 2], pa.int32())}))
+    subscriptions.close()
+    batches = list(subscription)
+    assert pa.Table.from_batches(batches, schema).to_pydict() == {"id": [1, 2]}
+    assert list(other) == []
+
+
+def test_slow_subscriber_is_cut_off():
+    subscriptions = Subscriptions(max_bytes=100)
+    data = pa.table({"id": list(range(10))})
+    subscription = subscriptions.subscribe("items", data.schema)
+
+    subscriptions.publish("items", data)
+    subscriptions.publish("items", data)
+    assert subscriptions.stats() == {"subscribers": 0, "published": 2, "cut_off": 1}
+    with pytest.raises(RuntimeError, match="fell more than 100 bytes behind"):
+        list(subscription)
+
+
+def test_reader_waits_for_batches():
+    subscriptions = Subscriptions(max_bytes=1024)
+    data = pa.table({"id": [1]})
+    subscription = subscriptions.subscribe("items", data.schema)
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(subscription))
+    reader.start()
+    subscriptions.publish("items", data)
+    subscriptions.close()
+    reader.join(timeout=5)
+    assert [b.num_rows for b in received] == [1]
+
+
+def test_poll_yields_none_while_idle():
+    subscriptions = Subscriptions(max_bytes=1024)
+    subscription = subscriptions.subscribe("items", pa.schema([("id", pa.int64())]))
+    polled = subscription.poll(timeout=0.01)
+    assert next(polled) is None
+    subscriptions.publish("items", pa.table({"id": [1]}))
+    assert next(polled).num_rows == 1
+    subscriptions.close()
+    assert list(polled) == []
@@ -0,0 +1,53 @@
+import pyarrow as pa
+import pytest
+
+from ruddy.models.filter import Filter
+from ruddy.models.table import Table
+from ruddy.models.ticket_wrapper import DataType, TicketWrapper
+
+
+def test_table_ticket_round_trip():
+    tw = TicketWrapper.from_table(Table(name="items"), partition=(0, 10))
+    tw.columns = ["id"]
+    tw.filters = [Filter.init(("id", ">", 1)), Filter.init(("name", "is null"))]
+    tw.limit = 5
+    assert TicketWrapper.deserialize(tw.serialize()).serialize() == tw.serialize()
+
+
+def test_command_ticket_round_trip():
+    tw = TicketWrapper.from_command(b"select 1")
+    assert TicketWrapper.deserialize(tw.serialize()).data == "select 1"
+
+
+def test_filter_to_sql():
+    assert Filter.init(('a"b', "in", [1, 2])).to_sql() == ('"a""b" in (?, ?)', [1, 2])
+    with pytest.raises(ValueError):
+        Filter.init(("id", "; drop table items", 1))
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_ticket_formats_are_interchangeable(compact: bool):
+    tw = TicketWrapper.from_table(Table(name="items"), partition=(10, None))
+    tw.columns = ["id", "name"]
+    tw.filters = [Filter.init(("id", "in", [1, 2]))]
+    tw.limit = 3
+    tw.since = "abc.0.0/10"
+    decoded = TicketWrapper.deserialize(tw.serialize(compact=compact))
+    assert decoded.serialize(compact=False) == tw.serialize(compact=False)
+
+
+def test_compact_ticket_validates_filters():
+    tw = TicketWrapper.from_table(Table(name="items"))
+    tw.filters = [Filter.model_construct(column="id", op="; drop", value=None)]
+    with pytest.raises(ValueError):
+        TicketWrapper.deserialize(tw.serialize(compact=True))
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_prepared_ticket_round_trip(compact):
+    parameters = pa.table({"p0": [1, 2], "p1": ["a", "b"]})
+    tw = TicketWrapper.from_prepared("abc", parameters)
+    decoded = TicketWrapper.deserialize(tw.serialize(compact=compact))
+    assert decoded.data_type == DataType.PREPARED
+    assert decoded.data == "abc"
+    assert decoded.parameters_table.equals(parameters)